@@ -0,0 +1,175 @@
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text, bindparam
+from .demand_forecasting import get_forecast_engine, load_sales_matrix
+
+METRICS = ['mae', 'mape', 'rmse', 'r2']
+
+def rolling_origin_cutoffs(n_days, horizon=14, n_cutoffs=4, step=None, min_train_days=28):
+    """
+    Get the forecast origins of a rolling-origin backtest as day indices
+
+    The last origin leaves exactly ``horizon`` days to score; earlier ones
+    step back by ``step`` days (the horizon by default) as long as at least
+    ``min_train_days`` of history remain before them.
+    """
+    step = step or horizon
+    last = n_days - horizon
+    cutoffs = [last - i * step for i in range(n_cutoffs)]
+    return sorted(cutoff for cutoff in cutoffs if cutoff >= min_train_days)
+
+def forecast_errors(actual, predicted):
+    """Score (fit, day) arrays of actuals and forecasts, one value per fit"""
+    error = actual - predicted
+    # Fits whose actuals are all zero have no MAPE
+    with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        percentage = np.where(actual != 0, np.abs(error / actual), np.nan)
+        total = ((actual - actual.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+        return {
+            'mae': np.abs(error).mean(axis=1),
+            'mape': np.nanmean(percentage, axis=1) * 100,
+            'rmse': np.sqrt((error ** 2).mean(axis=1)),
+            'r2': np.where(total > 0, 1 - (error ** 2).sum(axis=1) / total, np.nan)
+        }
+
+# Sales matrix shared with the worker processes, set once per process by
+# the pool initializer
+_worker_matrix = None
+
+def _init_backtest_worker(matrix):
+    global _worker_matrix
+    _worker_matrix = matrix
+
+def _backtest_task(engine, rows, cutoff, horizon):
+    """Fit the given products on the history before a cutoff and forecast"""
+    start = time.perf_counter()
+    history = pd.DataFrame(
+        _worker_matrix.values[rows, :cutoff].T,
+        index=_worker_matrix.dates[:cutoff],
+        columns=_worker_matrix.product_ids[rows]
+    )
+    predicted = engine.predict(history, horizon)
+    return rows, cutoff, predicted, time.perf_counter() - start
+
+def run_backtest(matrix, engines=('holt_winters',), horizon=14, n_cutoffs=4, step=None,
+                 product_classes=None, max_workers=None):
+    """
+    Rolling-origin backtest of forecasting engines over a SalesMatrix
+
+    Every (product, cutoff) pair is fitted on the days before the cutoff
+    and scored on the following ``horizon`` days. The matrix is handed to
+    each worker process once; Prophet fits are fanned out one product per
+    task, the vectorized engines one block of products per task.
+    ``product_classes`` maps product ids to the class the metrics are
+    summarized by. Returns per-fit metrics and timings, the per-class
+    distribution of each metric and the wall-clock time per engine.
+    """
+    try:
+        cutoffs = rolling_origin_cutoffs(matrix.shape[1], horizon, n_cutoffs, step)
+        if not cutoffs:
+            raise ValueError("Not enough history for a backtest with this horizon.")
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+
+        frames = []
+        wall_clock = {}
+        for engine_name in engines:
+            engine = get_forecast_engine(engine_name)
+            start = time.perf_counter()
+            n_products = matrix.shape[0]
+            if engine.name == 'prophet':
+                chunks = [[row] for row in range(n_products)]
+            else:
+                chunks = np.array_split(np.arange(n_products), min(max_workers, n_products))
+            tasks = [(engine, list(rows), cutoff, horizon) for cutoff in cutoffs for rows in chunks]
+
+            if max_workers == 1:
+                _init_backtest_worker(matrix)
+                outputs = [_backtest_task(*task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=min(max_workers, len(tasks)),
+                    initializer=_init_backtest_worker,
+                    initargs=(matrix,)
+                ) as executor:
+                    futures = [executor.submit(_backtest_task, *task) for task in tasks]
+                    outputs = [future.result() for future in futures]
+            wall_clock[engine.name] = time.perf_counter() - start
+
+            for rows, cutoff, predicted, seconds in outputs:
+                actual = matrix.values[rows, cutoff:cutoff + horizon].astype(float)
+                scores = forecast_errors(actual, predicted)
+                frames.append(pd.DataFrame({
+                    'engine': engine.name,
+                    'product_id': matrix.product_ids[rows],
+                    'cutoff': matrix.dates[cutoff],
+                    **scores,
+                    'fit_seconds': seconds / len(rows)
+                }))
+
+        metrics = pd.concat(frames, ignore_index=True)
+        classes = pd.Series(product_classes or {}, dtype=object)
+        metrics['product_class'] = metrics['product_id'].map(classes).fillna('all')
+
+        summary = metrics.groupby(['engine', 'product_class'])[METRICS].describe(
+            percentiles=[0.1, 0.5, 0.9]
+        )
+        timings = metrics.groupby('engine')['fit_seconds'].agg(['count', 'mean', 'max'])
+        timings['wall_clock_seconds'] = pd.Series(wall_clock)
+
+        return {
+            'metrics': metrics,
+            'summary': summary,
+            'timings': timings,
+            'cutoffs': [matrix.dates[cutoff] for cutoff in cutoffs]
+        }
+    except Exception as e:
+        raise Exception(f"Error in backtesting: {str(e)}")
+
+def get_product_classes(db: Session, product_ids=None):
+    """Map product ids to their category"""
+    query = "SELECT product_id, category FROM products"
+    params = {}
+    if product_ids is not None:
+        query += " WHERE product_id IN :product_ids"
+        params['product_ids'] = list(product_ids)
+    statement = text(query)
+    if product_ids is not None:
+        statement = statement.bindparams(bindparam('product_ids', expanding=True))
+    return dict(db.execute(statement, params).all())
+
+def backtest(db: Session, engines=('holt_winters',), product_ids=None, horizon=14,
+             n_cutoffs=4, step=None, max_workers=None):
+    """Backtest engines on the sales history, summarized per product category"""
+    matrix = load_sales_matrix(db, product_ids)
+    return run_backtest(
+        matrix, engines, horizon, n_cutoffs, step,
+        product_classes=get_product_classes(db, product_ids),
+        max_workers=max_workers
+    )
+
+if __name__ == "__main__":
+    import sys
+    from ..database.db_connection import get_db
+
+    # python -m src.analysis.backtesting [--horizon=N] [--cutoffs=N] [engine ...]
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--'))
+    engines = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or ['holt_winters']
+    db = next(get_db())
+    try:
+        results = backtest(
+            db, engines,
+            horizon=int(options.get('horizon', 14)),
+            n_cutoffs=int(options.get('cutoffs', 4))
+        )
+        pd.set_option('display.width', 200)
+        print(results['summary'].xs('50%', axis=1, level=1))
+        print(results['timings'])
+    finally:
+        db.close()
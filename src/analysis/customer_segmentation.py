@@ -1,7 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from ..database.models import Customer, Transaction, TransactionItem
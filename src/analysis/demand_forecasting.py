@@ -1,61 +1,156 @@
+import logging
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from prophet import Prophet
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from ..database.models import Transaction, TransactionItem, Product
 from ..database.db_connection import get_db
-from sqlalchemy.sql import text
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, mean_squared_error, r2_score
+from .model_store import load_model_params, save_model_params, warm_start_params
+from sqlalchemy.sql import text, bindparam
 
-def prepare_time_series_data(db: Session, product_id=None, days_back=365):
+logger = logging.getLogger(__name__)
+
+# Prophet (with cmdstanpy) and scikit-learn are imported inside the functions
+# that use them, so importing this module stays cheap
+
+# Prophet settings of get_demand_forecast, also part of the forecast cache key
+PROPHET_PARAMS = {
+    'daily_seasonality': False,  # Disable daily seasonality to prevent overfitting
+    'seasonality_mode': 'multiplicative',
+    'changepoint_prior_scale': 0.05,
+    'seasonality_prior_scale': 10.0,
+    'holidays_prior_scale': 10.0,
+    'interval_width': 0.95
+}
+
+class SalesMatrix:
     """
-    Prepare time series data for forecasting
+    Zero-filled daily sales of many products as a dense (product, day) array
+
+    Built by scattering the aggregated (date, product, quantity) rows into
+    the array, so no (date, product) pairs are materialized in Python.
+    Long and wide frames are only created when asked for.
     """
-    # Get cutoff date
-    cutoff_date = datetime.now() - timedelta(days=days_back)
+    def __init__(self, values, product_ids, dates):
+        self.values = values
+        self.product_ids = np.asarray(product_ids)
+        self.dates = pd.DatetimeIndex(dates, name='ds')
     
-    try:
-        # Query transactions with direct SQL for better performance
-        query = """
-            SELECT 
-                DATE(t.transaction_date) as date,
-                COALESCE(SUM(ti.quantity), 0) as total_quantity,
-                ti.product_id
-            FROM transactions t
-            JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
-            WHERE t.transaction_date >= :cutoff_date
-            GROUP BY DATE(t.transaction_date), ti.product_id
+    @classmethod
+    def from_records(cls, dates, product_ids, quantities, start, end, products=None):
+        """
+        Build the matrix for the days from start to end from sales rows
+
+        Rows are the products with sales, or ``products`` in the given order
+        (including those without sales) when it is passed.
         """
+        calendar = pd.date_range(start=pd.Timestamp(start).normalize(),
+                                 end=pd.Timestamp(end).normalize(), freq='D')
+        product_ids = np.asarray(product_ids)
+        if products is None:
+            products, rows = np.unique(product_ids, return_inverse=True)
+        else:
+            products = np.asarray(list(products))
+            rows = pd.Index(products).get_indexer(product_ids)
+        columns = (pd.DatetimeIndex(pd.to_datetime(dates)).normalize() - calendar[0]).days.to_numpy()
         
-        if product_id:
-            query += " HAVING ti.product_id = :product_id"
+        # Scatter the rows into the flattened array, dropping any outside it
+        keep = (rows >= 0) & (columns >= 0) & (columns < len(calendar))
+        flat = rows[keep] * len(calendar) + columns[keep]
+        values = np.bincount(
+            flat,
+            weights=np.asarray(quantities, dtype=float)[keep],
+            minlength=len(products) * len(calendar)
+        ).astype(np.float32).reshape(len(products), len(calendar))
+        return cls(values, products, calendar)
+    
+    @property
+    def shape(self):
+        return self.values.shape
+    
+    def row(self, product_id):
+        """Daily sales of one product"""
+        index = pd.Index(self.product_ids).get_loc(product_id)
+        return self.values[index]
+    
+    def to_frame(self):
+        """Wide view: one row per date, one column per product"""
+        return pd.DataFrame(self.values.T, index=self.dates, columns=self.product_ids)
+    
+    def to_long(self, product_id=None, nonzero_only=False):
+        """
+        Long view with ds, y and product_id columns, for one product or all;
+        ``nonzero_only`` keeps just the days with sales
+        """
+        values = self.values
+        product_ids = self.product_ids
+        if product_id is not None:
+            values = self.row(product_id)[None, :]
+            product_ids = np.array([product_id])
         
-        # Execute query
-        result = db.execute(text(query), {
-            'cutoff_date': cutoff_date,
-            'product_id': product_id
+        if nonzero_only:
+            rows, columns = np.nonzero(values)
+        else:
+            rows, columns = np.divmod(np.arange(values.size), values.shape[1])
+        return pd.DataFrame({
+            'ds': self.dates[columns],
+            'y': values[rows, columns],
+            'product_id': product_ids[rows]
         })
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(result.fetchall(), columns=['ds', 'y', 'product_id'])
-        
-        # Fill in missing dates with zeros
-        if not df.empty:
-            date_range = pd.date_range(start=cutoff_date, end=datetime.now(), freq='D')
-            if product_id:
-                template = pd.DataFrame({'ds': date_range})
-                template['product_id'] = product_id
-                df = template.merge(df, on=['ds', 'product_id'], how='left')
-            else:
-                product_ids = df['product_id'].unique()
-                template = pd.DataFrame([(d, p) for d in date_range for p in product_ids],
-                                     columns=['ds', 'product_id'])
-                df = template.merge(df, on=['ds', 'product_id'], how='left')
-            
-            df['y'] = df['y'].fillna(0)
-        
-        return df
+
+def load_sales_matrix(db: Session, product_ids=None, start=None):
+    """
+    Read the daily sales of many products from the rollup with one query
+
+    The matrix spans ``start`` (by default the first rollup day, or a year
+    back) to today, the same range as get_demand_forecast.
+    """
+    query = """
+        SELECT s.date, s.product_id, SUM(s.units) as quantity
+        FROM daily_product_store_sales s
+        WHERE 1 = 1
+    """
+    params = {}
+    if start is not None:
+        query += " AND s.date >= :start"
+        params['start'] = start
+    if product_ids is not None:
+        query += " AND s.product_id IN :product_ids"
+        params['product_ids'] = list(product_ids)
+    query += " GROUP BY s.date, s.product_id"
+    statement = text(query)
+    if product_ids is not None:
+        statement = statement.bindparams(bindparam('product_ids', expanding=True))
+    
+    sales = pd.read_sql(statement, db.bind, params=params)
+    
+    today = pd.Timestamp(datetime.now().date())
+    if start is None:
+        start = db.execute(text("SELECT MIN(date) FROM daily_product_store_sales")).scalar()
+        start = pd.Timestamp(start) if start is not None else today - pd.Timedelta(days=365)
+    return SalesMatrix.from_records(
+        sales['date'], sales['product_id'], sales['quantity'], start, today,
+        products=product_ids
+    )
+
+def prepare_time_series_data(db: Session, product_id=None, days_back=365):
+    """
+    Prepare time series data for forecasting
+
+    Returns a SalesMatrix of the products with sales in the last
+    ``days_back`` days; use to_long() for a ds, y, product_id frame.
+    """
+    # Get cutoff date
+    cutoff_date = (datetime.now() - timedelta(days=days_back)).date()
+    
+    try:
+        return load_sales_matrix(
+            db, [product_id] if product_id else None, start=cutoff_date
+        )
     except Exception as e:
         raise Exception(f"Error preparing time series data: {str(e)}")
 
@@ -63,9 +158,13 @@ def forecast_demand(daily_sales, forecast_periods=30, product_id=None):
     """
     Forecast demand using Prophet
     """
+    from prophet import Prophet
+    
     try:
         # Prepare data for Prophet
-        if product_id:
+        if isinstance(daily_sales, SalesMatrix):
+            prophet_data = daily_sales.to_long(product_id)
+        elif product_id:
             prophet_data = daily_sales[daily_sales['product_id'] == product_id].copy()
         else:
             prophet_data = daily_sales.copy()
@@ -127,42 +226,60 @@ def analyze_forecast_accuracy(model, forecast, actual_data):
         'comparison': comparison
     }
 
+def _seasonal_effect(model, name, dates):
+    """
+    Evaluate one fitted seasonality of a Prophet model on the given dates
+
+    Multiplies the seasonality's Fourier features by its fitted
+    coefficients, which is what predict() does for the component, without
+    predicting the trend or sampling uncertainty intervals.
+    """
+    props = model.seasonalities[name]
+    features = model.fourier_series(pd.Series(dates), props['period'], props['fourier_order'])
+    columns = model.train_component_cols[name].to_numpy() == 1
+    beta = np.asarray(model.params['beta']).mean(axis=0)[columns]
+    effect = features @ beta
+    if props['mode'] == 'additive':
+        effect = effect * model.y_scale
+    return effect
+
 def get_seasonal_patterns(model):
     """Extract seasonal patterns from the Prophet model"""
     try:
         # Get yearly seasonality
-        yearly = pd.DataFrame({
-            'ds': pd.date_range(start='2023-01-01', end='2023-12-31', freq='D'),
-            'seasonal': 'yearly'
-        })
-        yearly_pattern = model.predict(yearly)[['ds', 'yearly']]
-        yearly_pattern['month'] = yearly_pattern['ds'].dt.month
-        yearly_avg = yearly_pattern.groupby('month')['yearly'].mean().reset_index()
+        if 'yearly' in model.seasonalities:
+            dates = pd.date_range(start='2023-01-01', end='2023-12-31', freq='D')
+            yearly_pattern = pd.DataFrame({
+                'month': dates.month,
+                'yearly': _seasonal_effect(model, 'yearly', dates)
+            })
+            yearly_avg = yearly_pattern.groupby('month')['yearly'].mean().reset_index()
+        else:
+            yearly_avg = pd.DataFrame()
         
         # Get weekly seasonality
-        weekly = pd.DataFrame({
-            'ds': pd.date_range(start='2023-01-01', end='2023-01-07', freq='D'),
-            'seasonal': 'weekly'
-        })
-        weekly_pattern = model.predict(weekly)[['ds', 'weekly']]
-        weekly_pattern['day'] = weekly_pattern['ds'].dt.day_name()
-        weekly_avg = weekly_pattern[['day', 'weekly']]
+        if 'weekly' in model.seasonalities:
+            dates = pd.date_range(start='2023-01-01', end='2023-01-07', freq='D')
+            weekly_avg = pd.DataFrame({
+                'day': dates.day_name(),
+                'weekly': _seasonal_effect(model, 'weekly', dates)
+            })
+        else:
+            weekly_avg = pd.DataFrame()
         
         # Get monthly seasonality if it exists
         if 'monthly' in model.seasonalities:
-            monthly = pd.DataFrame({
-                'ds': pd.date_range(start='2023-01-01', end='2023-01-31', freq='D'),
-                'seasonal': 'monthly'
+            dates = pd.date_range(start='2023-01-01', end='2023-01-31', freq='D')
+            monthly_avg = pd.DataFrame({
+                'day_of_month': dates.day,
+                'monthly': _seasonal_effect(model, 'monthly', dates)
             })
-            monthly_pattern = model.predict(monthly)[['ds', 'monthly']]
-            monthly_pattern['day_of_month'] = monthly_pattern['ds'].dt.day
-            monthly_avg = monthly_pattern[['day_of_month', 'monthly']]
         else:
             monthly_avg = pd.DataFrame()
         
         return {
-            'yearly': yearly_avg.to_dict('records'),
-            'weekly': weekly_avg.to_dict('records'),
+            'yearly': yearly_avg.to_dict('records') if not yearly_avg.empty else None,
+            'weekly': weekly_avg.to_dict('records') if not weekly_avg.empty else None,
             'monthly': monthly_avg.to_dict('records') if not monthly_avg.empty else None
         }
         
@@ -174,14 +291,43 @@ def get_seasonal_patterns(model):
             'monthly': None
         }
 
-def get_demand_forecast(db, product_id, forecast_periods=30):
-    """Get demand forecast for a specific product"""
+def get_demand_forecast(db, product_id, forecast_periods=30, use_cache=True, engine='prophet'):
+    """
+    Get demand forecast for a specific product
+
+    Results are cached per product, horizon, model parameters and sales
+    data version, so repeated requests skip the model fit until new sales
+    of the product reach the daily sales rollup. ``engine`` is one of
+    FORECAST_ENGINES or a ForecastEngine instance.
+    """
+    forecast_engine = get_forecast_engine(engine)
+    if use_cache:
+        from .forecast_cache import cached_forecast
+        return cached_forecast(
+            db, product_id, forecast_periods, forecast_engine.params,
+            lambda: get_demand_forecast(
+                db, product_id, forecast_periods, use_cache=False, engine=forecast_engine
+            )
+        )
+    
+    if forecast_engine.name != 'prophet':
+        try:
+            history = get_sales_history(db, [product_id])
+            return forecast_engine.forecast(history, forecast_periods)[product_id]
+        except Exception as e:
+            print(f"Error generating forecast: {str(e)}")
+            return {
+                'forecast': pd.DataFrame(),
+                'accuracy': {'mae': None, 'mape': None, 'rmse': None, 'r2': None},
+                'error': str(e)
+            }
+    
     try:
-        # Get historical sales data with daily aggregation using a more robust query
+        # Get historical daily sales from the rollup, zero-filled over the full date range
         query = text("""
             WITH date_range AS (
                 SELECT generate_series(
-                    COALESCE((SELECT MIN(transaction_date)::date FROM transactions), CURRENT_DATE - INTERVAL '365 days'),
+                    COALESCE((SELECT MIN(date) FROM daily_product_store_sales), CURRENT_DATE - INTERVAL '365 days'),
                     CURRENT_DATE,
                     '1 day'::interval
                 )::date AS date
@@ -189,11 +335,10 @@ def get_demand_forecast(db, product_id, forecast_periods=30):
             daily_sales AS (
                 SELECT 
                     dr.date,
-                    COALESCE(SUM(ti.quantity), 0) as quantity
+                    COALESCE(SUM(s.units), 0) as quantity
                 FROM date_range dr
-                LEFT JOIN transactions t ON dr.date = DATE(t.transaction_date)
-                LEFT JOIN transaction_items ti ON t.transaction_id = ti.transaction_id 
-                    AND ti.product_id = :product_id
+                LEFT JOIN daily_product_store_sales s ON dr.date = s.date
+                    AND s.product_id = :product_id
                 GROUP BY dr.date
                 ORDER BY dr.date
             )
@@ -220,6 +365,59 @@ def get_demand_forecast(db, product_id, forecast_periods=30):
         # Drop the original columns and any rows with NaN
         df = df[['ds', 'y']].dropna()
         
+        # Warm-start from the product's previous fit when there is one
+        init = load_model_params(db, [product_id]).get(product_id)
+        result = fit_forecast(df, forecast_periods, init=init)
+        params = result.pop('model_params', None)
+        if params is not None:
+            save_model_params(db, {product_id: params})
+        return result
+        
+    except Exception as e:
+        print(f"Error generating forecast: {str(e)}")
+        return {
+            'forecast': pd.DataFrame(),
+            'accuracy': {'mae': None, 'mape': None, 'rmse': None, 'r2': None},
+            'error': str(e)
+        }
+
+def build_prophet_model(n_days):
+    """Create the Prophet model of fit_forecast for a training series length"""
+    from prophet import Prophet
+    
+    # Initialize Prophet model with custom parameters
+    model = Prophet(
+        yearly_seasonality=n_days >= 365,  # Only use yearly seasonality if we have enough data
+        weekly_seasonality=n_days >= 14,   # Only use weekly seasonality if we have enough data
+        **PROPHET_PARAMS
+    )
+    
+    # Add country-specific holidays if we have enough data
+    if n_days >= 90:  # Only add holidays if we have at least 3 months of data
+        model.add_country_holidays(country_name='US')
+    
+    # Add custom monthly seasonality if we have enough data
+    if n_days >= 60:  # Only add monthly seasonality if we have at least 2 months of data
+        model.add_seasonality(
+            name='monthly',
+            period=30.5,
+            fourier_order=5
+        )
+    return model
+
+def fit_forecast(df, forecast_periods=30, init=None):
+    """
+    Fit a Prophet model on a daily sales frame with ds and y columns and
+    forecast the next ``forecast_periods`` days
+
+    ``init`` warm-starts the optimizer from a previous fit's parameters
+    (see model_store); the fitted parameters are returned as model_params.
+    """
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+    
+    try:
+        df = df.copy()
+        
         if len(df) < 7:  # Require at least a week of data
             return {
                 'forecast': pd.DataFrame(),
@@ -245,32 +443,13 @@ def get_demand_forecast(db, product_id, forecast_periods=30):
         train = df[:train_size]
         test = df[train_size:] if train_size < len(df) else pd.DataFrame()
         
-        # Initialize and fit Prophet model with custom parameters
-        model = Prophet(
-            yearly_seasonality=len(train) >= 365,  # Only use yearly seasonality if we have enough data
-            weekly_seasonality=len(train) >= 14,   # Only use weekly seasonality if we have enough data
-            daily_seasonality=False,  # Disable daily seasonality to prevent overfitting
-            seasonality_mode='multiplicative',
-            changepoint_prior_scale=0.05,
-            seasonality_prior_scale=10.0,
-            holidays_prior_scale=10.0,
-            interval_width=0.95
-        )
-        
-        # Add country-specific holidays if we have enough data
-        if len(train) >= 90:  # Only add holidays if we have at least 3 months of data
-            model.add_country_holidays(country_name='US')
-        
-        # Add custom monthly seasonality if we have enough data
-        if len(train) >= 60:  # Only add monthly seasonality if we have at least 2 months of data
-            model.add_seasonality(
-                name='monthly',
-                period=30.5,
-                fourier_order=5
-            )
-        
-        # Fit the model
-        model.fit(train)
+        # Fit the model, starting from the previous parameters if given;
+        # Prophet falls back to its defaults for parameters whose shape changed
+        model = build_prophet_model(len(train))
+        if init is not None:
+            model.fit(train, init=init)
+        else:
+            model.fit(train)
         
         # Make future dataframe
         future = model.make_future_dataframe(
@@ -313,7 +492,8 @@ def get_demand_forecast(db, product_id, forecast_periods=30):
                 'rmse': rmse,
                 'r2': r2
             },
-            'seasonality': seasonal_patterns
+            'seasonality': seasonal_patterns,
+            'model_params': warm_start_params(model)
         }
         
     except Exception as e:
@@ -324,6 +504,581 @@ def get_demand_forecast(db, product_id, forecast_periods=30):
             'error': str(e)
         }
 
+def get_sales_history(db, product_ids=None):
+    """
+    Get the zero-filled daily sales of many products with one query
+
+    Returns a frame indexed by date with one column per product, spanning
+    the same date range as get_demand_forecast.
+    """
+    return load_sales_matrix(db, product_ids).to_frame()
+
+class ForecastEngine:
+    """
+    Interface of the forecasting engines
+
+    An engine forecasts every column of a daily sales frame (dates as the
+    index, one column per product, as returned by get_sales_history) and
+    returns a result per product in the format of get_demand_forecast:
+    a forecast frame with ds, yhat, yhat_lower, yhat_upper and trend
+    columns, accuracy metrics and seasonal patterns, or an error.
+    """
+    name = None
+    
+    @property
+    def params(self):
+        """Settings that determine the engine's output, e.g. for cache keys"""
+        return {'engine': self.name}
+    
+    def forecast(self, history, forecast_periods=30):
+        raise NotImplementedError
+    
+    def predict(self, history, forecast_periods=30):
+        """
+        Point forecasts only: a (product, forecast_periods) array of yhat
+        for the days after the history, in the order of its columns
+        """
+        raise NotImplementedError
+
+class ProphetForecastEngine(ForecastEngine):
+    """One Prophet model per product, see fit_forecast"""
+    name = 'prophet'
+    
+    @property
+    def params(self):
+        return {'engine': self.name, **PROPHET_PARAMS}
+    
+    def forecast(self, history, forecast_periods=30):
+        results = {}
+        for product_id in history.columns:
+            df = pd.DataFrame({
+                'ds': history.index,
+                'y': history[product_id].to_numpy(dtype=float)
+            })
+            results[product_id] = fit_forecast(df, forecast_periods)
+            results[product_id].pop('model_params', None)
+        return results
+    
+    def predict(self, history, forecast_periods=30):
+        future = pd.DataFrame({'ds': pd.date_range(
+            history.index[-1] + pd.Timedelta(days=1), periods=forecast_periods, freq='D'
+        )})
+        predictions = np.empty((len(history.columns), forecast_periods))
+        for row, product_id in enumerate(history.columns):
+            model = build_prophet_model(len(history))
+            model.fit(pd.DataFrame({
+                'ds': history.index,
+                'y': history[product_id].to_numpy(dtype=float)
+            }))
+            predictions[row] = model.predict(future)['yhat'].to_numpy()
+        return predictions
+
+class NumpyForecastEngine(ForecastEngine):
+    """
+    Vectorized exponential smoothing over many series at once
+
+    Methods are ``seasonal_naive``, ``exponential_smoothing`` (level only)
+    and ``holt_winters`` (additive level, trend and weekly season). All
+    series share the smoothing parameters, so the recursions run once
+    over time on whole (series, day) arrays.
+    """
+    METHODS = ['seasonal_naive', 'exponential_smoothing', 'holt_winters']
+    
+    def __init__(self, method='holt_winters', season_length=7, alpha=0.3, beta=0.05,
+                 gamma=0.2, interval_width=0.95):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown forecasting method: {method}")
+        self.name = method
+        self.season_length = season_length
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.interval_width = interval_width
+    
+    @property
+    def params(self):
+        return {
+            'engine': self.name,
+            'season_length': self.season_length,
+            'alpha': self.alpha,
+            'beta': self.beta,
+            'gamma': self.gamma,
+            'interval_width': self.interval_width
+        }
+    
+    def fit_predict(self, values, forecast_periods=30, start=None):
+        """
+        Fit every row of a (series, day) array and forecast it
+
+        Returns (series, days + forecast_periods) arrays of yhat, yhat_lower,
+        yhat_upper and trend (in-sample one-step-ahead fits followed by the
+        forecast), plus the final seasonal profile of each series. ``start``
+        is the date of the first day, for engines with calendar features.
+        """
+        from statistics import NormalDist
+        
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        n_series, n_days = values.shape
+        horizon = np.arange(1, forecast_periods + 1)
+        fitted, trend, future, future_trend, season = self._fit(values, horizon, start)
+        
+        # Prediction intervals from the in-sample one-step-ahead errors,
+        # widening with the square root of the horizon
+        residuals = values - fitted
+        sigma = np.sqrt(np.nanmean(residuals ** 2, axis=1, keepdims=True))
+        sigma = np.nan_to_num(sigma)
+        z = NormalDist().inv_cdf(0.5 + self.interval_width / 2)
+        width = np.concatenate([
+            np.broadcast_to(z * sigma, (n_series, n_days)),
+            z * sigma * np.sqrt(horizon)
+        ], axis=1)
+        
+        yhat = np.concatenate([fitted, future], axis=1)
+        # Days before the first one-step fit reuse the actual values
+        yhat = np.where(np.isnan(yhat), np.pad(values, ((0, 0), (0, forecast_periods))), yhat)
+        return {
+            'yhat': yhat,
+            'yhat_lower': yhat - width,
+            'yhat_upper': yhat + width,
+            'trend': np.concatenate([trend, future_trend], axis=1),
+            'season': season
+        }
+    
+    def _fit(self, values, horizon, start=None):
+        """
+        Get the in-sample fits, trend, forecast, forecast trend and seasonal
+        profile of every series
+        """
+        if self.name == 'seasonal_naive' or (
+            self.name == 'holt_winters' and values.shape[1] < 2 * self.season_length
+        ):
+            return self._seasonal_naive(values, horizon)
+        return self._smooth(values, horizon)
+    
+    def _seasonal_naive(self, values, horizon):
+        """Repeat the last observed season"""
+        n_series, n_days = values.shape
+        m = min(self.season_length, n_days)
+        fitted = np.full(values.shape, np.nan)
+        fitted[:, m:] = values[:, :-m]
+        last_season = values[:, -m:]
+        future = last_season[:, (horizon - 1) % m]
+        level = last_season.mean(axis=1, keepdims=True)
+        trend = np.full(values.shape, np.nan)
+        if n_days >= m:
+            # Moving average over a full season as the trend line
+            cumulative = np.cumsum(np.pad(values, ((0, 0), (1, 0))), axis=1)
+            trend[:, m - 1:] = (cumulative[:, m:] - cumulative[:, :-m]) / m
+        future_trend = np.broadcast_to(level, future.shape).copy()
+        return fitted, trend, future, future_trend, last_season - level
+    
+    def _smooth(self, values, horizon):
+        """Run the exponential smoothing recursions across all series"""
+        n_series, n_days = values.shape
+        m = self.season_length
+        seasonal = self.name == 'holt_winters'
+        alpha = self.alpha
+        beta = self.beta if seasonal else 0.0
+        gamma = self.gamma if seasonal else 0.0
+        
+        if seasonal:
+            first = values[:, :m].mean(axis=1)
+            second = values[:, m:2 * m].mean(axis=1)
+            level = first
+            slope = (second - first) / m
+            season = values[:, :m] - first[:, None]
+            start = m
+        else:
+            level = values[:, 0].copy()
+            slope = np.zeros(n_series)
+            season = np.zeros((n_series, m))
+            start = 1
+        
+        fitted = np.full(values.shape, np.nan)
+        trend = np.full(values.shape, np.nan)
+        trend[:, :start] = level[:, None]
+        for t in range(start, n_days):
+            s = season[:, t % m]
+            fitted[:, t] = level + slope + s
+            y = values[:, t]
+            previous = level
+            level = alpha * (y - s) + (1 - alpha) * (level + slope)
+            slope = beta * (level - previous) + (1 - beta) * slope
+            season[:, t % m] = gamma * (y - level) + (1 - gamma) * s
+            trend[:, t] = level
+        
+        future_trend = level[:, None] + slope[:, None] * horizon
+        future = future_trend + season[:, (n_days + horizon - 1) % m]
+        # Seasonal profile in the order of the last m days
+        profile = season[:, (np.arange(n_days - m, n_days)) % m]
+        return fitted, trend, future, future_trend, profile
+    
+    def accuracy(self, values, min_test_days=3, start=None):
+        """
+        Hold out the end of every series, like fit_forecast, and score the
+        forecast of it; returns arrays of MAE, MAPE, RMSE and R² per series
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        n_days = values.shape[1]
+        train_size = int(n_days * 0.8)
+        if train_size < 14:
+            train_size = n_days - 7 if n_days > 7 else n_days
+        test = values[:, train_size:]
+        if test.shape[1] < min_test_days:
+            return None
+        
+        predicted = self.fit_predict(
+            values[:, :train_size], test.shape[1], start
+        )['yhat'][:, train_size:]
+        error = test - predicted
+        with np.errstate(divide='ignore', invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            percentage = np.where(test != 0, np.abs(error / test), np.nan)
+            total = ((test - test.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+            return {
+                'mae': np.abs(error).mean(axis=1),
+                'mape': np.nanmean(percentage, axis=1) * 100,
+                'rmse': np.sqrt((error ** 2).mean(axis=1)),
+                'r2': np.where(total > 0, 1 - (error ** 2).sum(axis=1) / total, np.nan)
+            }
+    
+    def predict(self, history, forecast_periods=30):
+        values = history.to_numpy(dtype=float).T
+        predicted = self.fit_predict(values, forecast_periods, history.index[0])
+        return predicted['yhat'][:, values.shape[1]:]
+    
+    def forecast(self, history, forecast_periods=30):
+        values = history.to_numpy(dtype=float).T
+        if values.shape[1] < 7:
+            return {
+                product_id: {
+                    'forecast': pd.DataFrame(),
+                    'accuracy': {'mae': None, 'mape': None, 'rmse': None, 'r2': None},
+                    'error': 'Insufficient data for forecasting. Need at least 7 days of data.'
+                }
+                for product_id in history.columns
+            }
+        
+        predicted = self.fit_predict(values, forecast_periods, history.index[0])
+        accuracy = self.accuracy(values, start=history.index[0])
+        dates = history.index.append(
+            pd.date_range(history.index[-1] + pd.Timedelta(days=1), periods=forecast_periods, freq='D')
+        )
+        weekdays = history.index[-self.season_length:].day_name()
+        
+        results = {}
+        for row, product_id in enumerate(history.columns):
+            metrics = {'mae': None, 'mape': None, 'rmse': None, 'r2': None}
+            if accuracy is not None:
+                metrics = {
+                    name: (float(scores[row]) if np.isfinite(scores[row]) else None)
+                    for name, scores in accuracy.items()
+                }
+            weekly = None
+            if self.name != 'exponential_smoothing' and self.season_length == 7:
+                weekly = [
+                    {'day': day, 'weekly': float(effect)}
+                    for day, effect in zip(weekdays, predicted['season'][row])
+                ]
+            results[product_id] = {
+                'forecast': pd.DataFrame({
+                    'ds': dates,
+                    'yhat': predicted['yhat'][row],
+                    'yhat_lower': predicted['yhat_lower'][row],
+                    'yhat_upper': predicted['yhat_upper'][row],
+                    'trend': predicted['trend'][row]
+                }),
+                'accuracy': metrics,
+                'seasonality': {'yearly': None, 'weekly': weekly, 'monthly': None}
+            }
+        return results
+
+class GlobalRegressionForecastEngine(NumpyForecastEngine):
+    """
+    One regression model shared by all products, on lag features
+
+    Every series is scaled by its mean, and lags, rolling means, standard
+    deviations and shares of selling days plus weekday and day-of-year
+    features are computed for all (series, day) pairs at once with
+    cumulative sums over the sales matrix. A single ridge or gradient
+    boosting model learns from every product, so sparse products borrow
+    patterns from the rest; forecasts are made recursively, one batched
+    prediction for all series per day.
+    """
+    METHODS = ['global_ridge', 'global_gradient_boosting']
+    LAGS = (1, 2, 3, 7, 14, 21, 28)
+    WINDOWS = (7, 28)
+    
+    def __init__(self, method='global_ridge', alpha=1.0, max_train_rows=1000000,
+                 interval_width=0.95, random_state=0, block_rows=1000000):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown forecasting method: {method}")
+        self.name = method
+        self.season_length = 7
+        self.alpha = alpha
+        self.max_train_rows = max_train_rows
+        self.interval_width = interval_width
+        self.random_state = random_state
+        # (series, day) rows whose features are built at once; does not
+        # change the results
+        self.block_rows = block_rows
+    
+    @property
+    def params(self):
+        return {
+            'engine': self.name,
+            'lags': list(self.LAGS),
+            'windows': list(self.WINDOWS),
+            'alpha': self.alpha,
+            'max_train_rows': self.max_train_rows,
+            'interval_width': self.interval_width
+        }
+    
+    @property
+    def lookback(self):
+        """Days of history needed for the features of one day"""
+        return max(self.LAGS + self.WINDOWS)
+    
+    def _model(self):
+        if self.name == 'global_ridge':
+            from sklearn.linear_model import Ridge
+            return Ridge(alpha=self.alpha)
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(max_iter=200, random_state=self.random_state)
+    
+    def features(self, scaled, days, level, offset=0, start=None):
+        """
+        Feature matrix of the given days (column indices) of a scaled
+        (series, day) array, one row per (series, day) in series-major
+        order, from the days before each of them only
+
+        ``level`` is the scale of each series and ``offset`` the day number
+        of the first column, for the calendar features.
+        """
+        n_series = scaled.shape[0]
+        shape = (n_series, len(days))
+        padded = np.pad(scaled, ((0, 0), (1, 0)))
+        cumulative = np.cumsum(padded, axis=1)
+        squares = np.cumsum(padded ** 2, axis=1)
+        selling = np.cumsum(padded > 0, axis=1)
+        
+        columns = [scaled[:, days - lag] for lag in self.LAGS]
+        for window in self.WINDOWS:
+            mean = (cumulative[:, days] - cumulative[:, days - window]) / window
+            square = (squares[:, days] - squares[:, days - window]) / window
+            columns += [
+                mean,
+                np.sqrt(np.maximum(square - mean ** 2, 0)),
+                (selling[:, days] - selling[:, days - window]) / window
+            ]
+        columns.append(np.broadcast_to(np.log1p(level)[:, None], shape))
+        
+        day_numbers = offset + days
+        first = pd.Timestamp(start) if start is not None else None
+        weekday = (day_numbers + (first.dayofweek if first is not None else 0)) % 7
+        columns += [np.broadcast_to(weekday == day, shape) for day in range(7)]
+        if first is not None:
+            angle = 2 * np.pi * (first.dayofyear - 1 + day_numbers) / 365.25
+            columns += [np.broadcast_to(np.sin(angle), shape), np.broadcast_to(np.cos(angle), shape)]
+        
+        return np.stack(columns, axis=-1).astype(np.float32).reshape(-1, len(columns))
+    
+    def _fit(self, values, horizon, start=None):
+        n_series, n_days = values.shape
+        lookback = self.lookback
+        if n_days < lookback + 2 * self.season_length:
+            # Too short for the lag features
+            return NumpyForecastEngine('seasonal_naive', self.season_length)._seasonal_naive(
+                values, horizon
+            )
+        
+        level = values.mean(axis=1)
+        level = np.where(level > 0, level, 1.0)
+        scaled = values / level[:, None]
+        
+        # One training row per (series, day) with a full lookback window.
+        # Features are built for blocks of series at a time, so the whole
+        # (series, day, feature) array is never held in memory at once.
+        days = np.arange(lookback, n_days)
+        n_rows = n_series * len(days)
+        size = max(1, self.block_rows // len(days))
+        blocks = [slice(first, min(first + size, n_series)) for first in range(0, n_series, size)]
+        
+        rows = np.arange(n_rows)
+        if n_rows > self.max_train_rows:
+            rng = np.random.default_rng(self.random_state)
+            rows = np.sort(rng.choice(n_rows, self.max_train_rows, replace=False))
+        X_train, y_train = [], []
+        for block in blocks:
+            first, last = np.searchsorted(rows, [block.start * len(days), block.stop * len(days)])
+            if first == last:
+                continue
+            selected = rows[first:last] - block.start * len(days)
+            X_train.append(self.features(scaled[block], days, level[block], 0, start)[selected])
+            y_train.append(scaled[block][:, days].ravel()[selected])
+        model = self._model()
+        model.fit(np.concatenate(X_train), np.concatenate(y_train))
+        
+        fitted = np.full(values.shape, np.nan)
+        for block in blocks:
+            X = self.features(scaled[block], days, level[block], 0, start)
+            fitted[block, lookback:] = (
+                np.maximum(model.predict(X), 0).reshape(-1, len(days)) * level[block, None]
+            )
+        
+        # Recursive forecast, feeding each day's predictions back as lags
+        extended = np.pad(scaled, ((0, 0), (0, len(horizon))))
+        for step in range(len(horizon)):
+            day = n_days + step
+            window = extended[:, day - lookback:day + 1]
+            X = self.features(window, np.array([lookback]), level, day - lookback, start)
+            extended[:, day] = np.maximum(model.predict(X), 0)
+        future = extended[:, n_days:] * level[:, None]
+        
+        # Weekly moving average of the fits and forecasts as the trend line
+        m = self.season_length
+        combined = np.concatenate([np.where(np.isnan(fitted), values, fitted), future], axis=1)
+        cumulative = np.cumsum(np.pad(combined, ((0, 0), (1, 0))), axis=1)
+        trend = np.full(combined.shape, np.nan)
+        trend[:, m - 1:] = (cumulative[:, m:] - cumulative[:, :-m]) / m
+        season = combined[:, n_days - m:n_days] - trend[:, n_days - 1:n_days]
+        return fitted, trend[:, :n_days], future, trend[:, n_days:], season
+
+FORECAST_ENGINES = (
+    ['prophet'] + NumpyForecastEngine.METHODS + GlobalRegressionForecastEngine.METHODS
+)
+
+def get_forecast_engine(engine='prophet', **params):
+    """Get a forecasting engine by name, or pass an engine instance through"""
+    if isinstance(engine, ForecastEngine):
+        return engine
+    if engine == 'prophet':
+        return ProphetForecastEngine()
+    if engine in GlobalRegressionForecastEngine.METHODS:
+        return GlobalRegressionForecastEngine(method=engine, **params)
+    return NumpyForecastEngine(method=engine, **params)
+
+# Sales history shared with the worker processes of batch_forecast, set once
+# per process by the pool initializer instead of being sent with every task
+_worker_history = None
+
+def _init_forecast_worker(history):
+    global _worker_history
+    _worker_history = history
+
+def _forecast_product(product_id, forecast_periods, init=None):
+    """Forecast one product of the shared history, timing the fit"""
+    start = time.perf_counter()
+    df = pd.DataFrame({
+        'ds': _worker_history.index,
+        'y': _worker_history[product_id].to_numpy(dtype=float)
+    })
+    result = fit_forecast(df, forecast_periods, init=init)
+    return product_id, result, time.perf_counter() - start
+
+def batch_forecast(db, product_ids=None, forecast_periods=30, max_workers=None, save=True,
+                   engine='prophet'):
+    """
+    Forecast demand for every product, or the given products, in parallel
+
+    The daily sales of all products are read with one query and handed to
+    each worker process once. Prophet fits run across a process pool sized
+    to the available cores; the NumPy engines forecast all products in one
+    vectorized pass instead. Forecasts and per-product fit times are
+    written to the forecasts table unless ``save`` is False.
+    """
+    try:
+        start = time.perf_counter()
+        forecast_engine = get_forecast_engine(engine)
+        history = get_sales_history(db, product_ids)
+        products = list(history.columns)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = max(1, min(max_workers, len(products)))
+        
+        forecasts = {}
+        fit_seconds = {}
+        errors = {}
+        if products and forecast_engine.name != 'prophet':
+            max_workers = 1
+            fit_start = time.perf_counter()
+            results = forecast_engine.forecast(history, forecast_periods)
+            # One fit covers every product; spread its time over them
+            seconds = (time.perf_counter() - fit_start) / len(products)
+            for product_id, result in results.items():
+                fit_seconds[product_id] = seconds
+                if 'error' in result:
+                    errors[product_id] = result['error']
+                else:
+                    forecasts[product_id] = result
+        elif products:
+            # Previous fits warm-start the optimizer
+            init = load_model_params(db, products)
+            model_params = {}
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_forecast_worker,
+                initargs=(history,)
+            ) as executor:
+                futures = [
+                    executor.submit(_forecast_product, product_id, forecast_periods,
+                                    init.get(product_id))
+                    for product_id in products
+                ]
+                for future in futures:
+                    product_id, result, seconds = future.result()
+                    fit_seconds[product_id] = seconds
+                    params = result.pop('model_params', None)
+                    if params is not None:
+                        model_params[product_id] = params
+                    if 'error' in result:
+                        errors[product_id] = result['error']
+                    else:
+                        forecasts[product_id] = result
+            if save:
+                save_model_params(db, model_params)
+        
+        if save and forecasts:
+            save_forecasts(db, forecasts, fit_seconds)
+        
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Forecasted {len(forecasts)} of {len(products)} products with "
+            f"{max_workers} workers in {elapsed:.2f}s"
+        )
+        return {
+            'forecasts': forecasts,
+            'fit_seconds': fit_seconds,
+            'errors': errors,
+            'workers': max_workers,
+            'seconds': elapsed
+        }
+    except Exception as e:
+        raise Exception(f"Error in batch forecasting: {str(e)}")
+
+def save_forecasts(db, forecasts, fit_seconds):
+    """Replace the stored forecasts of the given products"""
+    # Imported here so the analysis module does not load the pipeline
+    from ..database.data_pipeline import DataPipeline
+    
+    frames = []
+    for product_id, result in forecasts.items():
+        frame = result['forecast'].rename(columns={'ds': 'date'})
+        frame.insert(0, 'product_id', int(product_id))
+        frame['date'] = pd.to_datetime(frame['date']).dt.date
+        frame['fit_seconds'] = fit_seconds.get(product_id)
+        frames.append(frame)
+    data = pd.concat(frames, ignore_index=True)
+    
+    db.execute(
+        text("DELETE FROM forecasts WHERE product_id IN :product_ids")
+            .bindparams(bindparam('product_ids', expanding=True)),
+        {'product_ids': [int(product_id) for product_id in forecasts]}
+    )
+    return DataPipeline(db).load_aggregated_data(
+        data, 'forecasts', key_columns=['product_id', 'date']
+    )
+
 def generate_forecast_recommendations(forecast_results):
     """
     Generate recommendations based on forecast results
@@ -351,4 +1106,24 @@ def generate_forecast_recommendations(forecast_results):
     if forecast_results['accuracy']['mape'] > 20:  # High error rate
         recommendations.append("Review and adjust forecasting model parameters")
     
-    return recommendations 
\ No newline at end of file
+    return recommendations 
+
+if __name__ == "__main__":
+    import sys
+    
+    # Nightly batch: python -m src.analysis.demand_forecasting [--engine=NAME] [product_id ...]
+    logging.basicConfig(level=logging.INFO)
+    engine = 'prophet'
+    product_ids = []
+    for arg in sys.argv[1:]:
+        if arg.startswith('--engine='):
+            engine = arg.split('=', 1)[1]
+        else:
+            product_ids.append(int(arg))
+    db = next(get_db())
+    try:
+        results = batch_forecast(db, product_ids or None, engine=engine)
+        for product_id, error in results['errors'].items():
+            logger.error(f"Product {product_id}: {error}")
+    finally:
+        db.close()
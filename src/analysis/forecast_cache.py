@@ -0,0 +1,152 @@
+import hashlib
+import io
+import json
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+# Number of cached forecasts kept; the least recently used are evicted
+MAX_CACHE_ENTRIES = 1000
+
+# Marks a DataFrame stored in its table JSON form
+FRAME_KEY = '__frame__'
+
+def _encode(value):
+    """Convert a forecast result into JSON-serializable values"""
+    if isinstance(value, pd.DataFrame):
+        return {FRAME_KEY: value.to_json(orient='table', index=False, date_format='iso')}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _decode_frame(value):
+    if list(value) == [FRAME_KEY]:
+        return pd.read_json(io.StringIO(value[FRAME_KEY]), orient='table')
+    return value
+
+def serialize_forecast(forecast):
+    """Serialize a forecast result as JSON, with frames in table form"""
+    return json.dumps(_encode(forecast), default=str)
+
+def deserialize_forecast(data):
+    """Read a forecast result written by serialize_forecast"""
+    return json.loads(data, object_hook=_decode_frame)
+
+def get_data_watermark(db: Session, product_id):
+    """
+    Get the version of the sales data a product's forecast is fitted on
+
+    Built from the product's rows in the daily sales rollup, so it changes
+    as soon as new sales of the product are rolled up, together with the
+    date range the forecast history spans.
+    """
+    row = db.execute(text("""
+        SELECT
+            (SELECT MIN(date) FROM daily_product_store_sales) as first_date,
+            COUNT(*) as days,
+            COALESCE(SUM(units), 0) as units,
+            MAX(date) as last_date
+        FROM daily_product_store_sales
+        WHERE product_id = :product_id
+    """), {'product_id': product_id}).one()
+    first_date, days, units, last_date = row
+    return f"{datetime.now().date()}:{first_date}:{days}:{units}:{last_date}"
+
+def get_cache_key(product_id, forecast_periods, model_params, watermark):
+    """Hash the inputs that determine a forecast into its cache key"""
+    payload = json.dumps(
+        [product_id, forecast_periods, model_params, watermark],
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def cached_forecast(db: Session, product_id, forecast_periods, model_params, compute,
+                    max_entries=MAX_CACHE_ENTRIES):
+    """
+    Return the cached forecast for these inputs, or compute and cache it
+
+    ``compute`` is called on a miss. Entries of the product fitted on older
+    sales data are dropped, and failed forecasts are not cached.
+    """
+    try:
+        watermark = get_data_watermark(db, product_id)
+        key = get_cache_key(product_id, forecast_periods, model_params, watermark)
+        now = datetime.now()
+
+        result = db.execute(
+            text("SELECT result FROM forecast_cache WHERE cache_key = :key"),
+            {'key': key}
+        ).scalar()
+        if result is not None:
+            db.execute(
+                text("UPDATE forecast_cache SET last_used_at = :now WHERE cache_key = :key"),
+                {'key': key, 'now': now}
+            )
+            db.commit()
+            return deserialize_forecast(result)
+    except Exception as e:
+        # The cache is an optimization; fall back to computing the forecast
+        logger.error(f"Error reading forecast cache: {str(e)}")
+        db.rollback()
+        return compute()
+
+    forecast = compute()
+    if 'error' in forecast:
+        return forecast
+
+    try:
+        # Stale versions of this product's forecasts can never be hit again
+        db.execute(
+            text("DELETE FROM forecast_cache WHERE product_id = :product_id AND watermark <> :watermark"),
+            {'product_id': product_id, 'watermark': watermark}
+        )
+        db.execute(text("""
+            INSERT INTO forecast_cache
+                (cache_key, product_id, forecast_periods, watermark, result, created_at, last_used_at)
+            VALUES (:key, :product_id, :forecast_periods, :watermark, :result, :now, :now)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                result = EXCLUDED.result,
+                last_used_at = EXCLUDED.last_used_at
+        """), {
+            'key': key,
+            'product_id': product_id,
+            'forecast_periods': forecast_periods,
+            'watermark': watermark,
+            'result': serialize_forecast(forecast),
+            'now': now
+        })
+        evict_forecasts(db, max_entries)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error writing forecast cache: {str(e)}")
+        db.rollback()
+    return forecast
+
+def evict_forecasts(db: Session, max_entries=MAX_CACHE_ENTRIES):
+    """Delete the least recently used forecasts beyond ``max_entries``"""
+    return db.execute(text("""
+        DELETE FROM forecast_cache
+        WHERE cache_key NOT IN (
+            SELECT cache_key FROM forecast_cache
+            ORDER BY last_used_at DESC
+            LIMIT :max_entries
+        )
+    """), {'max_entries': max_entries}).rowcount
+
+def clear_forecast_cache(db: Session, product_id=None):
+    """Invalidate the cached forecasts of one product, or all of them"""
+    query = "DELETE FROM forecast_cache"
+    if product_id is not None:
+        query += " WHERE product_id = :product_id"
+    deleted = db.execute(text(query), {'product_id': product_id}).rowcount
+    db.commit()
+    return deleted
@@ -0,0 +1,193 @@
+import json
+import logging
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+from .demand_forecasting import batch_forecast, get_forecast_engine
+
+logger = logging.getLogger(__name__)
+
+# Horizon of the precomputed forecasts; the dashboard shows shorter ones
+# by cutting them
+PRECOMPUTE_PERIODS = 90
+# Days of in-sample fits stored with each forecast for display
+HISTORY_DAYS = 180
+
+def _jsonable(value):
+    """Convert numpy values to Python ones and NaN to None, recursively"""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def _to_json(value):
+    return json.dumps(_jsonable(value), default=str)
+
+def save_product_forecasts(db: Session, forecasts, engine, forecast_periods, fit_seconds=None,
+                           history_days=HISTORY_DAYS):
+    """
+    Store each product's forecast, accuracy metrics and seasonality
+
+    ``forecasts`` maps product ids to results in the format of
+    get_demand_forecast; the forecast frame is kept from ``history_days``
+    before the forecast starts. Replaces the previous row of each product.
+    """
+    if not forecasts:
+        return 0
+    fit_seconds = fit_seconds or {}
+    now = datetime.now()
+    records = []
+    for product_id, result in forecasts.items():
+        frame = result['forecast'][['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend']]
+        first = frame['ds'].max() - pd.Timedelta(days=forecast_periods + history_days)
+        frame = frame[frame['ds'] > first]
+        accuracy = {
+            name: (float(value) if value is not None and np.isfinite(value) else None)
+            for name, value in result['accuracy'].items()
+        }
+        records.append({
+            'product_id': int(product_id),
+            'engine': engine,
+            'forecast_periods': forecast_periods,
+            'forecast': _to_json({
+                'ds': frame['ds'].dt.strftime('%Y-%m-%d').tolist(),
+                **{column: frame[column].tolist()
+                   for column in ['yhat', 'yhat_lower', 'yhat_upper', 'trend']}
+            }),
+            'mae': accuracy.get('mae'),
+            'mape': accuracy.get('mape'),
+            'rmse': accuracy.get('rmse'),
+            'r2': accuracy.get('r2'),
+            'seasonality': _to_json(result.get('seasonality')),
+            'fit_seconds': fit_seconds.get(product_id),
+            'generated_at': now
+        })
+    try:
+        db.execute(text("""
+            INSERT INTO product_forecasts (
+                product_id, engine, forecast_periods, forecast, mae, mape, rmse, r2,
+                seasonality, fit_seconds, generated_at
+            )
+            VALUES (
+                :product_id, :engine, :forecast_periods, :forecast, :mae, :mape, :rmse, :r2,
+                :seasonality, :fit_seconds, :generated_at
+            )
+            ON CONFLICT (product_id) DO UPDATE SET
+                engine = EXCLUDED.engine,
+                forecast_periods = EXCLUDED.forecast_periods,
+                forecast = EXCLUDED.forecast,
+                mae = EXCLUDED.mae,
+                mape = EXCLUDED.mape,
+                rmse = EXCLUDED.rmse,
+                r2 = EXCLUDED.r2,
+                seasonality = EXCLUDED.seasonality,
+                fit_seconds = EXCLUDED.fit_seconds,
+                generated_at = EXCLUDED.generated_at
+        """), records)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error saving product forecasts: {str(e)}")
+        db.rollback()
+        return 0
+    return len(records)
+
+def load_product_forecast(db: Session, product_id, forecast_periods=None):
+    """
+    Get a product's precomputed forecast in the format of get_demand_forecast,
+    with the engine and generated_at, or None if there is none
+
+    ``forecast_periods`` cuts the forecast to a shorter horizon.
+    """
+    row = db.execute(text("""
+        SELECT engine, forecast_periods, forecast, mae, mape, rmse, r2, seasonality, generated_at
+        FROM product_forecasts
+        WHERE product_id = :product_id
+    """), {'product_id': product_id}).mappings().one_or_none()
+    if row is None:
+        return None
+
+    forecast = pd.DataFrame(json.loads(row['forecast']))
+    forecast['ds'] = pd.to_datetime(forecast['ds'])
+    if forecast_periods is not None and forecast_periods < row['forecast_periods']:
+        last = forecast['ds'].max() - pd.Timedelta(days=row['forecast_periods'] - forecast_periods)
+        forecast = forecast[forecast['ds'] <= last]
+    return {
+        'forecast': forecast.astype({
+            column: float for column in ['yhat', 'yhat_lower', 'yhat_upper', 'trend']
+        }),
+        'accuracy': {name: row[name] for name in ['mae', 'mape', 'rmse', 'r2']},
+        'seasonality': json.loads(row['seasonality']) if row['seasonality'] else None,
+        'engine': row['engine'],
+        'generated_at': row['generated_at']
+    }
+
+def precompute_forecasts(db: Session, product_ids=None, engine='prophet',
+                         forecast_periods=PRECOMPUTE_PERIODS, max_workers=None):
+    """
+    Forecast every product, or the given products, and store the results
+    for the dashboard
+
+    Runs batch_forecast, which also fills the forecasts table, and saves
+    each product's forecast, accuracy and seasonality in product_forecasts.
+    """
+    forecast_engine = get_forecast_engine(engine)
+    results = batch_forecast(
+        db, product_ids, forecast_periods, max_workers=max_workers, engine=forecast_engine
+    )
+    results['stored'] = save_product_forecasts(
+        db, results['forecasts'], forecast_engine.name, forecast_periods, results['fit_seconds']
+    )
+    return results
+
+def run_scheduler(engine='prophet', forecast_periods=PRECOMPUTE_PERIODS, every_hours=None,
+                  max_workers=None):
+    """
+    Precompute all forecasts once, or every ``every_hours`` hours until
+    interrupted; the sales rollup is refreshed before each run
+    """
+    from ..database.db_connection import get_db
+    from ..database.rollups import refresh_daily_sales
+
+    while True:
+        start = time.perf_counter()
+        db = next(get_db())
+        try:
+            refresh_daily_sales(db)
+            results = precompute_forecasts(
+                db, engine=engine, forecast_periods=forecast_periods, max_workers=max_workers
+            )
+            logger.info(
+                f"Stored forecasts of {results['stored']} products "
+                f"({len(results['errors'])} failed) in {time.perf_counter() - start:.1f}s"
+            )
+        except Exception as e:
+            logger.error(f"Error precomputing forecasts: {str(e)}")
+            if every_hours is None:
+                raise
+        finally:
+            db.close()
+        if every_hours is None:
+            return
+        time.sleep(max(0, every_hours * 3600 - (time.perf_counter() - start)))
+
+if __name__ == "__main__":
+    import sys
+
+    # Once, e.g. from cron: python -m src.analysis.forecast_store [--engine=NAME] [--periods=90]
+    # As a long-running scheduler: python -m src.analysis.forecast_store --every=24
+    logging.basicConfig(level=logging.INFO)
+    options = dict(arg[2:].split('=', 1) for arg in sys.argv[1:] if arg.startswith('--'))
+    run_scheduler(
+        engine=options.get('engine', 'prophet'),
+        forecast_periods=int(options.get('periods', PRECOMPUTE_PERIODS)),
+        every_hours=float(options['every']) if 'every' in options else None,
+        max_workers=int(options['workers']) if 'workers' in options else None
+    )
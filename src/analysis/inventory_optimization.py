@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from ..database.models import Inventory, TransactionItem, Product
@@ -106,59 +105,234 @@ def calculate_safety_stock(lead_time_demand, service_level, demand_std):
     """
     Calculate safety stock level
     """
+    from scipy.stats import norm
+    
     z_score = norm.ppf(service_level)
     return z_score * demand_std * np.sqrt(lead_time_demand)
 
-def optimize_inventory_levels(inventory_data, sales_history, lead_time=7, service_level=0.95):
+def calculate_demand_statistics(sales_history, keys=('store_id', 'product_id'), n_days=None):
+    """
+    Get the mean and standard deviation of demand per store and product
+    (or per ``keys``), indexed by them
+
+    With ``n_days`` the rows are daily totals over that many days, and the
+    days without a row count as zero-sale days, as in get_demand_summary.
+    """
+    grouped = sales_history.groupby(list(keys))['quantity']
+    if n_days is None:
+        return pd.DataFrame({
+            'daily_demand': grouped.mean(),
+            'demand_std': grouped.std().fillna(0)
+        })
+    
+    total = grouped.sum().astype(float)
+    squares = (sales_history['quantity'].astype(float) ** 2).groupby(
+        [sales_history[key] for key in keys]
+    ).sum()
+    variance = (squares - total ** 2 / n_days) / max(n_days - 1, 1)
+    return pd.DataFrame({
+        'daily_demand': total / n_days,
+        'demand_std': np.sqrt(variance.clip(lower=0))
+    })
+
+def get_demand_summary(db: Session, days_back=365):
+    """
+    Get daily demand statistics per store and product from the sales rollup
+
+    The database aggregates the daily totals to their mean, standard
+    deviation and number of days with sales, counting days without a
+    rollup row as zero sales, so one row per store and product is
+    returned. The window is the last ``days_back`` days, or the days
+    since the rollup starts if that is shorter.
+    """
+    query = text("""
+        WITH window_days AS (
+            SELECT start_date, CURRENT_DATE - start_date + 1 as days
+            FROM (
+                SELECT GREATEST(
+                    CURRENT_DATE - CAST(:days_back AS INTEGER),
+                    COALESCE(MIN(date), CURRENT_DATE)
+                ) as start_date
+                FROM daily_product_store_sales
+            ) bounds
+        )
+        SELECT
+            s.store_id,
+            s.product_id,
+            SUM(s.units)::float / w.days as daily_demand,
+            CASE WHEN w.days > 1 THEN SQRT(GREATEST(
+                SUM(s.units::float * s.units) - SUM(s.units)::float * SUM(s.units) / w.days,
+                0
+            ) / (w.days - 1)) ELSE 0 END as demand_std,
+            COUNT(*) as sales_days,
+            w.days as days
+        FROM daily_product_store_sales s
+        CROSS JOIN window_days w
+        WHERE s.date >= w.start_date
+            AND s.date <= CURRENT_DATE
+        GROUP BY s.store_id, s.product_id, w.days
+    """)
+    return pd.read_sql(query, db.bind, params={'days_back': days_back})
+
+def forecast_lead_time_demand(forecast, lead_time=7, interval_width=0.95, start=None):
+    """
+    Get expected demand and its standard deviation over the lead time from
+    daily forecasts
+
+    ``forecast`` is a long frame with product_id (and store_id, for store
+    level forecasts), a ds or date column and yhat, yhat_lower and
+    yhat_upper, e.g. the forecasts table. The days after ``start`` (today
+    by default) up to the lead time are used; each day's standard
+    deviation is read off its ``interval_width`` prediction interval and
+    days are taken as independent. Returns daily_demand, lead_time_demand
+    and lead_time_std per product, or per store and product.
+    """
+    from statistics import NormalDist
+    
+    dates = pd.to_datetime(forecast['ds' if 'ds' in forecast.columns else 'date'])
+    start = pd.Timestamp(start if start is not None else datetime.now()).normalize()
+    window = forecast[(dates > start) & (dates <= start + pd.Timedelta(days=lead_time))]
+    
+    z = NormalDist().inv_cdf(0.5 + interval_width / 2)
+    keys = [key for key in ['store_id', 'product_id'] if key in forecast.columns]
+    daily = pd.DataFrame({
+        'yhat': window['yhat'].clip(lower=0),
+        'variance': ((window['yhat_upper'] - window['yhat_lower']) / (2 * z)) ** 2
+    }).groupby([window[key] for key in keys]).mean()
+    # Averages scale to the full lead time when some days are missing
+    return pd.DataFrame({
+        'daily_demand': daily['yhat'],
+        'lead_time_demand': daily['yhat'] * lead_time,
+        'lead_time_std': np.sqrt(daily['variance'] * lead_time)
+    })
+
+def forecasts_to_frame(forecasts):
+    """Stack batch_forecast results into one long frame with a product_id column"""
+    frames = [
+        result['forecast'].assign(product_id=product_id)
+        for product_id, result in forecasts.items()
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def load_lead_time_forecasts(db: Session, lead_time=7):
+    """Read the stored forecasts of the next ``lead_time`` days"""
+    query = text("""
+        SELECT product_id, date, yhat, yhat_lower, yhat_upper
+        FROM forecasts
+        WHERE date > CURRENT_DATE
+            AND date <= CURRENT_DATE + CAST(:lead_time AS INTEGER)
+    """)
+    return pd.read_sql(query, db.bind, params={'lead_time': lead_time})
+
+def _lookup(index, frame, keys):
+    """Position of each row of ``frame`` in ``index``, -1 where missing"""
+    if len(keys) > 1:
+        return index.get_indexer(pd.MultiIndex.from_frame(frame[keys]))
+    return index.get_indexer(pd.Index(frame[keys[0]]))
+
+def optimize_inventory_levels(inventory_data, sales_history, lead_time=7, service_level=0.95,
+                              ordering_cost=50, holding_cost_rate=0.2, forecast=None,
+                              interval_width=0.95):
     """
     Optimize inventory levels using EOQ and safety stock calculations
+
+    ``sales_history`` is either sales rows with a quantity column or a
+    demand summary with daily_demand and demand_std columns, such as
+    get_demand_summary returns. Demand is taken per store and product,
+    keyed on a (store_id, product_id) MultiIndex, and matched to the
+    inventory rows by position, so EOQ, safety stock and reorder point
+    are computed for every inventory row with sales in one vectorized
+    pass. Sales without a store_id fall back to per-product demand.
+    Returns one row per inventory row with demand, in inventory order.
+
+    With a ``forecast`` (see forecast_lead_time_demand) demand over the
+    lead time and its uncertainty come from the forecasts instead of the
+    history, and daily_demand and demand_std are the forecast's. Product
+    level forecasts are split between stores by their share of the
+    product's historical demand; store demands are assumed independent,
+    so a store with share s gets s of the mean and s of the variance
+    (sqrt(s) of the standard deviation).
     """
     try:
-        # Calculate daily demand per product
-        daily_demand = sales_history.groupby('product_id')['quantity'].mean()
-        annual_demand = daily_demand * 365
-        
-        # Set cost parameters
-        ordering_cost = 50  # Cost per order
-        holding_cost_rate = 0.2  # Annual holding cost as percentage of unit cost
-        
-        # Calculate holding cost per unit
-        inventory_with_demand = inventory_data[
-            inventory_data['product_id'].isin(annual_demand.index)
-        ]
-        holding_cost = inventory_with_demand['unit_cost'] * holding_cost_rate
+        keys = ['product_id']
+        if 'store_id' in sales_history.columns and 'store_id' in inventory_data.columns:
+            keys = ['store_id', 'product_id']
+        if {'daily_demand', 'demand_std'} <= set(sales_history.columns):
+            # Already summarized, e.g. by get_demand_summary
+            demand = sales_history.set_index(keys)[['daily_demand', 'demand_std']]
+        else:
+            demand = calculate_demand_statistics(sales_history, keys)
         
-        # Ensure annual_demand and holding_cost are aligned
-        annual_demand = annual_demand[inventory_with_demand['product_id']]
+        # Position of each inventory row's demand, -1 without sales
+        positions = _lookup(demand.index, inventory_data, keys)
+        has_demand = positions >= 0
         
-        # Calculate EOQ
-        eoq = calculate_eoq(annual_demand, ordering_cost, holding_cost)
+        if forecast is not None:
+            lead_time_demand = forecast_lead_time_demand(forecast, lead_time, interval_width)
+            forecast_keys = list(lead_time_demand.index.names)
+            forecast_positions = _lookup(lead_time_demand.index, inventory_data, forecast_keys)
+            has_demand &= forecast_positions >= 0
+            forecast_positions = forecast_positions[has_demand]
+            
+            share = np.ones(has_demand.sum())
+            if forecast_keys == ['product_id'] and len(keys) > 1:
+                # Each store's share of the product's historical demand
+                totals = demand['daily_demand'].groupby(level='product_id').transform('sum')
+                shares = (demand['daily_demand'] / totals).fillna(0).to_numpy()
+                share = shares[positions[has_demand]]
         
-        # Calculate demand standard deviation
-        demand_std = sales_history.groupby('product_id')['quantity'].std().fillna(0)
+        inventory = inventory_data[has_demand]
+        positions = positions[has_demand]
+        daily_demand = demand['daily_demand'].to_numpy()[positions]
+        demand_std = demand['demand_std'].to_numpy()[positions]
         
-        # Calculate safety stock
-        safety_stock = calculate_safety_stock(lead_time, service_level, demand_std)
+        if forecast is not None:
+            daily_demand = lead_time_demand['daily_demand'].to_numpy()[forecast_positions] * share
+            expected = lead_time_demand['lead_time_demand'].to_numpy()[forecast_positions] * share
+            # Daily standard deviation implied by the forecast intervals, so
+            # demand_std is the one the safety stock is computed from. Store
+            # demand is taken as independent, so each store gets its share
+            # of the variance rather than of the standard deviation.
+            demand_std = (
+                lead_time_demand['lead_time_std'].to_numpy()[forecast_positions] * np.sqrt(share)
+                / np.sqrt(lead_time)
+            )
+            safety_stock = calculate_safety_stock(lead_time, service_level, demand_std)
+            reorder_point = expected + safety_stock
+        else:
+            safety_stock = calculate_safety_stock(lead_time, service_level, demand_std)
+            reorder_point = daily_demand * lead_time + safety_stock
         
-        # Calculate reorder point
-        reorder_point = (daily_demand * lead_time) + safety_stock
+        # Annual holding cost per unit as a share of the unit cost
+        holding_cost = inventory['unit_cost'].to_numpy(dtype=float) * holding_cost_rate
+        eoq = calculate_eoq(daily_demand * 365, ordering_cost, holding_cost).to_numpy()
         
-        # Create recommendations DataFrame
         recommendations = pd.DataFrame({
-            'product_id': inventory_with_demand['product_id'],
-            'current_quantity': inventory_with_demand['quantity'],
+            'product_id': inventory['product_id'].to_numpy(),
+            'current_quantity': inventory['quantity'].to_numpy(),
+            'daily_demand': daily_demand,
+            'demand_std': demand_std,
             'eoq': eoq,
             'safety_stock': safety_stock,
             'reorder_point': reorder_point,
-            'current_reorder_point': inventory_with_demand['reorder_point']
+            'current_reorder_point': inventory['reorder_point'].to_numpy(),
+            'unit_cost': inventory['unit_cost'].to_numpy()
         })
+        if 'store_id' in inventory.columns:
+            recommendations.insert(0, 'store_id', inventory['store_id'].to_numpy())
         
         return recommendations
     except Exception as e:
         raise Exception(f"Error optimizing inventory levels: {str(e)}")
 
-def get_inventory_optimization_insights(db):
-    """Get inventory optimization insights using ABC analysis"""
+def get_inventory_optimization_insights(db, use_forecasts=False, lead_time=7):
+    """
+    Get inventory optimization insights using ABC analysis
+
+    With ``use_forecasts`` reorder points and safety stock come from the
+    stored forecasts of the next ``lead_time`` days (see batch_forecast),
+    falling back to the sales history when there are none.
+    """
     try:
         # Get inventory data with product details
         query = text("""
@@ -211,22 +385,18 @@ def get_inventory_optimization_insights(db):
             'potential_revenue': 'sum'
         }).reset_index()
         
-        # Get sales history for optimization
-        sales_query = text("""
-            SELECT 
-                ti.product_id,
-                ti.quantity,
-                t.transaction_date
-            FROM transaction_items ti
-            JOIN transactions t ON ti.transaction_id = t.transaction_id
-            WHERE t.transaction_date >= NOW() - INTERVAL '1 year'
-        """)
-        
-        sales_history = pd.read_sql(sales_query, db.bind)
+        # Daily demand per store and product, summarized by the database
+        sales_history = get_demand_summary(db)
         
         if not sales_history.empty:
+            forecast = load_lead_time_forecasts(db, lead_time) if use_forecasts else None
+            if forecast is not None and forecast.empty:
+                forecast = None
+            
             # Optimize inventory levels
-            optimization_results = optimize_inventory_levels(df, sales_history)
+            optimization_results = optimize_inventory_levels(
+                df, sales_history, lead_time=lead_time, forecast=forecast
+            )
             
             # Generate recommendations
             recommendations = generate_inventory_recommendations(optimization_results)
@@ -251,25 +421,35 @@ def get_inventory_optimization_insights(db):
         }
 
 def generate_inventory_recommendations(optimization_results):
-    """Generate inventory recommendations based on optimization results"""
-    recommendations = []
+    """
+    Generate inventory recommendations based on optimization results
+
+    Rows at or below their reorder point get a Reorder of the EOQ, rows
+    above twice their reorder point a Reduce Stock to the reorder point
+    plus safety stock. Actions are picked for all rows at once with
+    boolean masks rather than row by row.
+    """
+    current = optimization_results['current_quantity'].to_numpy(dtype=float)
+    reorder_point = optimization_results['reorder_point'].to_numpy(dtype=float)
+    
+    reorder = current <= reorder_point
+    reduce = ~reorder & (current > reorder_point * 2)
+    conditions = [reorder, reduce]
+    keep = reorder | reduce
     
-    for _, row in optimization_results.iterrows():
-        if row['current_quantity'] <= row['reorder_point']:
-            recommendations.append({
-                'product_id': row['product_id'],
-                'action': 'Reorder',
-                'current_quantity': row['current_quantity'],
-                'recommended_quantity': row['eoq'],
-                'reorder_point': row['reorder_point']
-            })
-        elif row['current_quantity'] > row['reorder_point'] * 2:
-            recommendations.append({
-                'product_id': row['product_id'],
-                'action': 'Reduce Stock',
-                'current_quantity': row['current_quantity'],
-                'recommended_quantity': row['reorder_point'] + row['safety_stock'],
-                'reorder_point': row['reorder_point']
-            })
+    action = np.select(conditions, ['Reorder', 'Reduce Stock'], default='')
+    recommended = np.select(conditions, [
+        optimization_results['eoq'].to_numpy(dtype=float),
+        reorder_point + optimization_results['safety_stock'].to_numpy(dtype=float)
+    ], default=np.nan)
     
-    return pd.DataFrame(recommendations) 
\ No newline at end of file
+    recommendations = pd.DataFrame({
+        'product_id': optimization_results['product_id'].to_numpy()[keep],
+        'action': action[keep],
+        'current_quantity': optimization_results['current_quantity'].to_numpy()[keep],
+        'recommended_quantity': recommended[keep],
+        'reorder_point': reorder_point[keep]
+    })
+    if 'store_id' in optimization_results.columns:
+        recommendations.insert(0, 'store_id', optimization_results['store_id'].to_numpy()[keep])
+    return recommendations
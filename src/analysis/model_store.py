@@ -0,0 +1,74 @@
+import json
+import logging
+from datetime import datetime
+import numpy as np
+from sqlalchemy import bindparam
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import text
+
+logger = logging.getLogger(__name__)
+
+def warm_start_params(model):
+    """
+    Get a fitted Prophet model's parameters in the form ``fit(init=...)``
+    takes, to start the next fit of the same product from them
+    """
+    params = {}
+    for name in ['k', 'm', 'sigma_obs']:
+        params[name] = float(np.asarray(model.params[name]).mean())
+    for name in ['delta', 'beta']:
+        params[name] = np.asarray(model.params[name]).mean(axis=0)
+    return params
+
+def load_model_params(db: Session, product_ids):
+    """Get the stored model parameters of the given products"""
+    try:
+        rows = db.execute(
+            text("SELECT product_id, params FROM forecast_models WHERE product_id IN :product_ids")
+                .bindparams(bindparam('product_ids', expanding=True)),
+            {'product_ids': [int(product_id) for product_id in product_ids]}
+        ).all()
+    except Exception as e:
+        # A missing store only means cold fits
+        logger.error(f"Error loading forecast models: {str(e)}")
+        db.rollback()
+        return {}
+
+    models = {}
+    for product_id, params in rows:
+        params = json.loads(params)
+        for name in ['delta', 'beta']:
+            params[name] = np.asarray(params[name], dtype=float)
+        models[product_id] = params
+    return models
+
+def save_model_params(db: Session, params_by_product):
+    """Store the latest fitted parameters of each product"""
+    if not params_by_product:
+        return 0
+    now = datetime.now()
+    records = [
+        {
+            'product_id': int(product_id),
+            'params': json.dumps({
+                name: (value.tolist() if isinstance(value, np.ndarray) else value)
+                for name, value in params.items()
+            }),
+            'fitted_at': now
+        }
+        for product_id, params in params_by_product.items()
+    ]
+    try:
+        db.execute(text("""
+            INSERT INTO forecast_models (product_id, params, fitted_at)
+            VALUES (:product_id, :params, :fitted_at)
+            ON CONFLICT (product_id) DO UPDATE SET
+                params = EXCLUDED.params,
+                fitted_at = EXCLUDED.fitted_at
+        """), records)
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error saving forecast models: {str(e)}")
+        db.rollback()
+        return 0
+    return len(records)
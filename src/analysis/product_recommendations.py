@@ -1,7 +1,5 @@
 import pandas as pd
 import numpy as np
-from mlxtend.frequent_patterns import apriori, association_rules
-from sklearn.metrics.pairwise import cosine_similarity
 from sqlalchemy.orm import Session
 from ..database.models import Transaction, TransactionItem, Product
 from ..database.db_connection import get_db
@@ -28,7 +26,8 @@ def prepare_transaction_data(db: Session, days_back=90):
         Product,
         TransactionItem.product_id == Product.product_id
     ).filter(
-        Transaction.transaction_date >= cutoff_date
+        Transaction.transaction_date >= cutoff_date,
+        TransactionItem.transaction_date >= cutoff_date
     ).all()
     
     # Convert to DataFrame
@@ -42,6 +41,8 @@ def generate_association_rules(transaction_data, min_support=0.01, min_confidenc
     """
     Generate association rules using Apriori algorithm
     """
+    from mlxtend.frequent_patterns import apriori, association_rules
+    
     # Create transaction matrix
     transaction_matrix = pd.crosstab(
         transaction_data['transaction_id'],
@@ -71,6 +72,8 @@ def create_product_similarity_matrix(transaction_data):
     """
     Create product similarity matrix using collaborative filtering
     """
+    from sklearn.metrics.pairwise import cosine_similarity
+    
     # Create user-item matrix
     user_item_matrix = pd.crosstab(
         transaction_data['transaction_id'],
@@ -145,6 +148,7 @@ def get_comprehensive_recommendations(db, product_id):
                 JOIN transactions t ON ti.transaction_id = t.transaction_id
                 JOIN products p ON ti.product_id = p.product_id
                 WHERE t.transaction_date >= NOW() - INTERVAL '90 days'
+                    AND ti.transaction_date >= NOW() - INTERVAL '90 days'
             )
             SELECT 
                 p1.product_id,
@@ -212,6 +216,7 @@ def get_comprehensive_recommendations(db, product_id):
             JOIN transaction_items ti ON p.product_id = ti.product_id
             JOIN transactions t ON ti.transaction_id = t.transaction_id
             WHERE t.transaction_date >= NOW() - INTERVAL '90 days'
+                AND ti.transaction_date >= NOW() - INTERVAL '90 days'
             GROUP BY p.category
             ORDER BY total_revenue DESC
         """)
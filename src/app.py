@@ -19,10 +19,14 @@ from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
 
-from src.database.db_connection import get_db, SessionLocal, init_db
+from src.database.db_connection import get_db, get_session_factory, init_db
 from src.database.data_pipeline import DataPipeline
+from src.database.rollups import refresh_daily_sales
+from src.database.migrations import apply_migrations
 from src.analysis.customer_segmentation import get_customer_segmentation_insights
-from src.analysis.demand_forecasting import get_demand_forecast
+from src.analysis.demand_forecasting import get_demand_forecast, FORECAST_ENGINES
+from src.analysis.forecast_cache import clear_forecast_cache
+from src.analysis.forecast_store import load_product_forecast, save_product_forecasts, PRECOMPUTE_PERIODS
 from src.analysis.inventory_optimization import get_inventory_optimization_insights
 from src.analysis.product_recommendations import get_comprehensive_recommendations
 from src.visualization.charts import (
@@ -41,6 +45,157 @@ def get_products(db):
     """)
     return pd.read_sql(query, db.bind)
 
+def display_forecast(forecast_result, product_name):
+    """Plot a forecast with its accuracy metrics and seasonal patterns"""
+    forecast_df = forecast_result['forecast']
+    accuracy = forecast_result['accuracy']
+    seasonality = forecast_result['seasonality']
+    
+    if not forecast_df.empty:
+        # Create forecast plot
+        fig = go.Figure()
+        
+        # Add historical data
+        historical_mask = forecast_df['ds'] <= pd.Timestamp.now()
+        fig.add_trace(go.Scatter(
+            x=forecast_df.loc[historical_mask, 'ds'],
+            y=forecast_df.loc[historical_mask, 'yhat'],
+            name='Historical',
+            line=dict(color='blue')
+        ))
+        
+        # Add forecast
+        forecast_mask = forecast_df['ds'] > pd.Timestamp.now()
+        fig.add_trace(go.Scatter(
+            x=forecast_df.loc[forecast_mask, 'ds'],
+            y=forecast_df.loc[forecast_mask, 'yhat'],
+            name='Forecast',
+            line=dict(color='red', dash='dash')
+        ))
+        
+        # Add confidence interval
+        fig.add_trace(go.Scatter(
+            x=forecast_df.loc[forecast_mask, 'ds'],
+            y=forecast_df.loc[forecast_mask, 'yhat_upper'],
+            fill=None,
+            mode='lines',
+            line_color='rgba(255,0,0,0)',
+            showlegend=False
+        ))
+        
+        fig.add_trace(go.Scatter(
+            x=forecast_df.loc[forecast_mask, 'ds'],
+            y=forecast_df.loc[forecast_mask, 'yhat_lower'],
+            fill='tonexty',
+            mode='lines',
+            line_color='rgba(255,0,0,0)',
+            name='95% Confidence Interval',
+            fillcolor='rgba(255,0,0,0.2)'
+        ))
+        
+        # Update layout
+        fig.update_layout(
+            title=f"Demand Forecast for {product_name}",
+            xaxis_title="Date",
+            yaxis_title="Quantity",
+            hovermode='x unified',
+            font=dict(size=12),
+            showlegend=True,
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1
+            )
+        )
+        
+        st.plotly_chart(fig, use_container_width=True)
+        
+        # Display accuracy metrics
+        if accuracy['mae'] is not None:
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("MAE", f"{accuracy['mae']:.2f}")
+            with col2:
+                st.metric("MAPE", f"{accuracy['mape']:.2%}")
+            with col3:
+                st.metric("RMSE", f"{accuracy['rmse']:.2f}")
+            with col4:
+                st.metric("R²", f"{accuracy['r2']:.3f}")
+        
+        # Display seasonal patterns
+        if seasonality:
+            st.subheader("Seasonal Patterns")
+            
+            tab1, tab2, tab3 = st.tabs(["Weekly", "Monthly", "Yearly"])
+            
+            with tab1:
+                if seasonality['weekly']:
+                    weekly_df = pd.DataFrame(seasonality['weekly'])
+                    fig_weekly = px.bar(
+                        weekly_df,
+                        x='day',
+                        y='weekly',
+                        title='Weekly Seasonality Pattern',
+                        labels={
+                            'day': 'Day of Week',
+                            'weekly': 'Seasonal Effect'
+                        }
+                    )
+                    fig_weekly.update_layout(
+                        xaxis_title="Day of Week",
+                        yaxis_title="Seasonal Effect",
+                        font=dict(size=12)
+                    )
+                    st.plotly_chart(fig_weekly, use_container_width=True)
+            
+            with tab2:
+                if seasonality['monthly']:
+                    monthly_df = pd.DataFrame(seasonality['monthly'])
+                    fig_monthly = px.line(
+                        monthly_df,
+                        x='day_of_month',
+                        y='monthly',
+                        title='Monthly Seasonality Pattern',
+                        labels={
+                            'day_of_month': 'Day of Month',
+                            'monthly': 'Seasonal Effect'
+                        }
+                    )
+                    fig_monthly.update_layout(
+                        xaxis_title="Day of Month",
+                        yaxis_title="Seasonal Effect",
+                        font=dict(size=12)
+                    )
+                    st.plotly_chart(fig_monthly, use_container_width=True)
+            
+            with tab3:
+                if seasonality['yearly']:
+                    yearly_df = pd.DataFrame(seasonality['yearly'])
+                    fig_yearly = px.line(
+                        yearly_df,
+                        x='month',
+                        y='yearly',
+                        title='Yearly Seasonality Pattern',
+                        labels={
+                            'month': 'Month',
+                            'yearly': 'Seasonal Effect'
+                        }
+                    )
+                    fig_yearly.update_layout(
+                        xaxis_title="Month",
+                        yaxis_title="Seasonal Effect",
+                        font=dict(size=12)
+                    )
+                    fig_yearly.update_xaxes(
+                        ticktext=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+                        tickvals=list(range(1, 13))
+                    )
+                    st.plotly_chart(fig_yearly, use_container_width=True)
+    else:
+        st.warning("Not enough data to generate forecast.")
+
 def display_demand_forecasting():
     st.header("Demand Forecasting")
     
@@ -49,7 +204,7 @@ def display_demand_forecasting():
         return
         
     # Get list of products
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         products = get_products(db)
         if products.empty:
@@ -67,167 +222,49 @@ def display_demand_forecasting():
         forecast_periods = st.slider(
             "Forecast periods (days):",
             min_value=7,
-            max_value=90,
+            max_value=PRECOMPUTE_PERIODS,
             value=30,
             step=7
         )
         
-        if st.button("Generate Forecast"):
-            with st.spinner("Generating forecast..."):
-                forecast_result = get_demand_forecast(db, selected_product, forecast_periods)
-                
-                if 'error' in forecast_result:
-                    st.error(forecast_result['error'])
+        # Prophet for detailed seasonality, the NumPy engines for fast results
+        # on long-tail products
+        engine = st.selectbox(
+            "Refit engine:",
+            options=FORECAST_ENGINES,
+            format_func=lambda x: x.replace('_', ' ').title()
+        )
+        
+        product_name = products.loc[products['product_id'] == selected_product, 'name'].iloc[0]
+        
+        # Forecasts are precomputed by the forecast_store job, so the page
+        # only reads them; models are fitted here on request only
+        if st.button("Refit Forecast"):
+            with st.spinner("Refitting forecast..."):
+                # Fit a new model instead of reading the cached one, and drop
+                # the cached entries it replaces
+                clear_forecast_cache(db, selected_product)
+                refit = get_demand_forecast(
+                    db, selected_product, PRECOMPUTE_PERIODS, use_cache=False, engine=engine
+                )
+                if 'error' in refit:
+                    st.error(refit['error'])
                     return
-                
-                forecast_df = forecast_result['forecast']
-                accuracy = forecast_result['accuracy']
-                seasonality = forecast_result['seasonality']
-                
-                if not forecast_df.empty:
-                    # Create forecast plot
-                    fig = go.Figure()
-                    
-                    # Add historical data
-                    historical_mask = forecast_df['ds'] <= pd.Timestamp.now()
-                    fig.add_trace(go.Scatter(
-                        x=forecast_df.loc[historical_mask, 'ds'],
-                        y=forecast_df.loc[historical_mask, 'yhat'],
-                        name='Historical',
-                        line=dict(color='blue')
-                    ))
-                    
-                    # Add forecast
-                    forecast_mask = forecast_df['ds'] > pd.Timestamp.now()
-                    fig.add_trace(go.Scatter(
-                        x=forecast_df.loc[forecast_mask, 'ds'],
-                        y=forecast_df.loc[forecast_mask, 'yhat'],
-                        name='Forecast',
-                        line=dict(color='red', dash='dash')
-                    ))
-                    
-                    # Add confidence interval
-                    fig.add_trace(go.Scatter(
-                        x=forecast_df.loc[forecast_mask, 'ds'],
-                        y=forecast_df.loc[forecast_mask, 'yhat_upper'],
-                        fill=None,
-                        mode='lines',
-                        line_color='rgba(255,0,0,0)',
-                        showlegend=False
-                    ))
-                    
-                    fig.add_trace(go.Scatter(
-                        x=forecast_df.loc[forecast_mask, 'ds'],
-                        y=forecast_df.loc[forecast_mask, 'yhat_lower'],
-                        fill='tonexty',
-                        mode='lines',
-                        line_color='rgba(255,0,0,0)',
-                        name='95% Confidence Interval',
-                        fillcolor='rgba(255,0,0,0.2)'
-                    ))
-                    
-                    # Update layout
-                    fig.update_layout(
-                        title=f"Demand Forecast for {products[products['product_id'] == selected_product]['name'].iloc[0]}",
-                        xaxis_title="Date",
-                        yaxis_title="Quantity",
-                        hovermode='x unified',
-                        font=dict(size=12),
-                        showlegend=True,
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=1.02,
-                            xanchor="right",
-                            x=1
-                        )
-                    )
-                    
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Display accuracy metrics
-                    if accuracy['mae'] is not None:
-                        col1, col2, col3, col4 = st.columns(4)
-                        with col1:
-                            st.metric("MAE", f"{accuracy['mae']:.2f}")
-                        with col2:
-                            st.metric("MAPE", f"{accuracy['mape']:.2%}")
-                        with col3:
-                            st.metric("RMSE", f"{accuracy['rmse']:.2f}")
-                        with col4:
-                            st.metric("R²", f"{accuracy['r2']:.3f}")
-                    
-                    # Display seasonal patterns
-                    if seasonality:
-                        st.subheader("Seasonal Patterns")
-                        
-                        tab1, tab2, tab3 = st.tabs(["Weekly", "Monthly", "Yearly"])
-                        
-                        with tab1:
-                            if seasonality['weekly']:
-                                weekly_df = pd.DataFrame(seasonality['weekly'])
-                                fig_weekly = px.bar(
-                                    weekly_df,
-                                    x='day',
-                                    y='weekly',
-                                    title='Weekly Seasonality Pattern',
-                                    labels={
-                                        'day': 'Day of Week',
-                                        'weekly': 'Seasonal Effect'
-                                    }
-                                )
-                                fig_weekly.update_layout(
-                                    xaxis_title="Day of Week",
-                                    yaxis_title="Seasonal Effect",
-                                    font=dict(size=12)
-                                )
-                                st.plotly_chart(fig_weekly, use_container_width=True)
-                        
-                        with tab2:
-                            if seasonality['monthly']:
-                                monthly_df = pd.DataFrame(seasonality['monthly'])
-                                fig_monthly = px.line(
-                                    monthly_df,
-                                    x='day_of_month',
-                                    y='monthly',
-                                    title='Monthly Seasonality Pattern',
-                                    labels={
-                                        'day_of_month': 'Day of Month',
-                                        'monthly': 'Seasonal Effect'
-                                    }
-                                )
-                                fig_monthly.update_layout(
-                                    xaxis_title="Day of Month",
-                                    yaxis_title="Seasonal Effect",
-                                    font=dict(size=12)
-                                )
-                                st.plotly_chart(fig_monthly, use_container_width=True)
-                        
-                        with tab3:
-                            if seasonality['yearly']:
-                                yearly_df = pd.DataFrame(seasonality['yearly'])
-                                fig_yearly = px.line(
-                                    yearly_df,
-                                    x='month',
-                                    y='yearly',
-                                    title='Yearly Seasonality Pattern',
-                                    labels={
-                                        'month': 'Month',
-                                        'yearly': 'Seasonal Effect'
-                                    }
-                                )
-                                fig_yearly.update_layout(
-                                    xaxis_title="Month",
-                                    yaxis_title="Seasonal Effect",
-                                    font=dict(size=12)
-                                )
-                                fig_yearly.update_xaxes(
-                                    ticktext=['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
-                                    tickvals=list(range(1, 13))
-                                )
-                                st.plotly_chart(fig_yearly, use_container_width=True)
-                else:
-                    st.warning("Not enough data to generate forecast.")
+                save_product_forecasts(db, {selected_product: refit}, engine, PRECOMPUTE_PERIODS)
+        
+        forecast_result = load_product_forecast(db, selected_product, forecast_periods)
+        if forecast_result is None:
+            st.info(
+                "No precomputed forecast for this product yet. Run "
+                "`python -m src.analysis.forecast_store` or refit it now."
+            )
+            return
+        
+        st.caption(
+            f"{forecast_result['engine'].replace('_', ' ').title()} forecast generated at "
+            f"{forecast_result['generated_at']:%Y-%m-%d %H:%M}"
+        )
+        display_forecast(forecast_result, product_name)
     except Exception as e:
         st.error(f"Error in demand forecasting: {str(e)}")
     finally:
@@ -267,20 +304,21 @@ def initialize_database():
     """Initialize the database schema"""
     try:
         init_db()
+        apply_migrations()
         st.session_state.db_initialized = True
         return True
     except Exception as e:
         st.error(f"Error initializing database: {str(e)}")
         return False
 
-def load_data():
-    """Load all necessary data"""
+def load_data(incremental=False):
+    """Load all necessary data, or only what changed since the last load"""
     if not st.session_state.db_initialized:
         if not initialize_database():
             return False
     
     with st.spinner("Loading data..."):
-        db = SessionLocal()
+        db = get_session_factory()()
         try:
             # Check if we have data in the database
             result = db.execute(text("SELECT COUNT(*) FROM products")).scalar()
@@ -292,9 +330,13 @@ def load_data():
                 generate_sample_data(db)
                 st.success("Sample data generated successfully!")
             
+            # Bring the daily sales rollup up to date with new transactions
+            refresh_daily_sales(db)
+            
             # Load data through pipeline
             pipeline = DataPipeline(db)
-            data = pipeline.run_pipeline()
+            previous = st.session_state.data if incremental else None
+            data = pipeline.run_pipeline(previous=previous, concurrent=True)
             st.session_state.data = data
             st.session_state.data_loaded = True
             return True
@@ -308,6 +350,8 @@ def load_data():
 if not st.session_state.data_loaded:
     if st.sidebar.button("Load Data"):
         load_data()
+elif st.sidebar.button("Refresh Data"):
+    load_data(incremental=True)
 
 # Overview Page
 if page == "Overview":
@@ -338,7 +382,7 @@ elif page == "Customer Segmentation":
     
     if st.session_state.data_loaded:
         with st.spinner("Analyzing customer segments..."):
-            db = SessionLocal()
+            db = get_session_factory()()
             try:
                 segmentation_result = get_customer_segmentation_insights(db)
                 
@@ -401,7 +445,7 @@ elif page == "Inventory Optimization":
     
     if st.session_state.data_loaded:
         with st.spinner("Analyzing inventory..."):
-            db = SessionLocal()
+            db = get_session_factory()()
             try:
                 inventory_result = get_inventory_optimization_insights(db)
                 
@@ -485,7 +529,7 @@ elif page == "Product Recommendations":
         
         if selected_product:
             with st.spinner("Generating recommendations..."):
-                db = SessionLocal()
+                db = get_session_factory()()
                 try:
                     recommendations = get_comprehensive_recommendations(db, product_id=selected_product)
                     
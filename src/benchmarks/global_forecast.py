@@ -0,0 +1,82 @@
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from src.analysis.demand_forecasting import get_forecast_engine, get_sales_history
+
+def make_history(n_products=1000, n_days=400, seed=0):
+    """Synthetic daily sales with trend, weekly season, noise and sparse products"""
+    rng = np.random.default_rng(seed)
+    days = np.arange(n_days)
+    level = rng.lognormal(1, 1, (n_products, 1))
+    values = (level * (1 + 0.001 * days)
+              + level * 0.3 * np.sin(2 * np.pi * days / 7)
+              + rng.normal(0, 1, (n_products, n_days)) * level * 0.2)
+    # A third of the products only sell on some days
+    sparse = rng.random(n_products) < 1 / 3
+    values[sparse] *= rng.random((sparse.sum(), n_days)) < 0.2
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=n_days, freq='D')
+    return pd.DataFrame(np.clip(values, 0, None).T, index=dates, columns=range(n_products))
+
+def time_engine(engine, history, forecast_periods=30):
+    """Forecast every column of the history, returning the results and seconds"""
+    start = time.perf_counter()
+    results = get_forecast_engine(engine).forecast(history, forecast_periods)
+    return results, time.perf_counter() - start
+
+def median_mae(results, products):
+    maes = [results[product_id]['accuracy']['mae'] for product_id in products
+            if 'error' not in results[product_id]]
+    maes = [mae for mae in maes if mae is not None]
+    return float(np.median(maes)) if maes else float('nan')
+
+def run_benchmark(history, engines=('global_ridge', 'global_gradient_boosting'), prophet_sample=20):
+    """
+    Time the global engines on the full catalog against per-product Prophet
+
+    Prophet is fitted on a sample of products and its catalog time is
+    extrapolated from the mean time per product. Accuracy is the median
+    holdout MAE over the same sample.
+    """
+    n_products = history.shape[1]
+    sample = list(history.columns[:prophet_sample])
+    rows = []
+    if prophet_sample:
+        results, seconds = time_engine('prophet', history[sample])
+        rows.append({
+            'engine': 'prophet',
+            'catalog_seconds': seconds / len(sample) * n_products,
+            'measured_products': len(sample),
+            'median_mae': median_mae(results, sample)
+        })
+    for engine in engines:
+        results, seconds = time_engine(engine, history)
+        rows.append({
+            'engine': engine,
+            'catalog_seconds': seconds,
+            'measured_products': n_products,
+            'median_mae': median_mae(results, sample)
+        })
+    return pd.DataFrame(rows).set_index('engine')
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.global_forecast [n_products] [--db] [--prophet-sample=N]
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+    options = dict(arg[2:].split('=', 1) if '=' in arg else (arg[2:], '')
+                   for arg in sys.argv[1:] if arg.startswith('--'))
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    if 'db' in options:
+        from src.database.db_connection import get_db
+        db = next(get_db())
+        try:
+            history = get_sales_history(db)
+        finally:
+            db.close()
+    else:
+        history = make_history(int(args[0]) if args else 1000)
+    result = run_benchmark(history, prophet_sample=int(options.get('prophet-sample', 20)))
+    print(f"{history.shape[1]} products x {history.shape[0]} days")
+    print(result.to_string(float_format=lambda value: f"{value:.3f}"))
@@ -0,0 +1,87 @@
+import os
+import re
+import subprocess
+import sys
+
+# Imports are resolved from the project root directory
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules whose cold start is tracked, the Streamlit app first
+MODULES = [
+    'src.app',
+    'src.analysis.customer_segmentation',
+    'src.analysis.demand_forecasting',
+    'src.analysis.inventory_optimization',
+    'src.analysis.product_recommendations',
+]
+
+# Libraries that should only load when a function needs them
+HEAVY_MODULES = ['prophet', 'cmdstanpy', 'sklearn', 'mlxtend', 'scipy']
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+def measure_import(module):
+    """
+    Import a module in a fresh interpreter under ``python -X importtime``
+
+    Returns the cumulative import time in milliseconds, the slowest
+    top-level imports it pulled in and the heavy libraries it loaded.
+    """
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=project_root, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        return {'module': module, 'error': error[-1] if error else 'import failed'}
+
+    total_us = 0
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        if name == module:
+            total_us = cumulative
+        # Packages imported directly by the interpreter or the module itself
+        if indent <= 3 and '.' not in name:
+            top_level[name] = max(top_level.get(name, 0), cumulative)
+
+    heavy = result.stdout.strip().splitlines()[-1] if result.stdout.strip() else ''
+    slowest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        'module': module,
+        'total_ms': total_us / 1000,
+        'slowest': [(name, us / 1000) for name, us in slowest],
+        'heavy_loaded': [name for name in heavy.split(',') if name]
+    }
+
+def run_benchmark(modules=None, repeat=3):
+    """Measure the cold-start import time of each module, best of ``repeat`` runs"""
+    results = []
+    for module in modules or MODULES:
+        runs = [measure_import(module) for _ in range(repeat)]
+        timed = [run for run in runs if 'error' not in run]
+        results.append(min(timed, key=lambda run: run['total_ms']) if timed else runs[0])
+    return results
+
+if __name__ == "__main__":
+    modules = [arg for arg in sys.argv[1:] if not arg.startswith('--')] or MODULES
+    failed = False
+    for result in run_benchmark(modules):
+        if 'error' in result:
+            print(f"{result['module']}: {result['error']}")
+            continue
+        heavy = ', '.join(result['heavy_loaded']) or 'none'
+        print(f"{result['module']}: {result['total_ms']:.1f} ms (heavy libraries loaded: {heavy})")
+        for name, ms in result['slowest']:
+            print(f"    {name:30} {ms:8.1f} ms")
+        failed = failed or bool(result['heavy_loaded'])
+    # --check fails when an import pulls in one of the heavy libraries
+    if '--check' in sys.argv:
+        sys.exit(1 if failed else 0)
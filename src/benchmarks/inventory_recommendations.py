@@ -0,0 +1,69 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from src.analysis.inventory_optimization import generate_inventory_recommendations
+
+SIZES = [10 ** 4, 10 ** 5, 10 ** 6]
+
+def make_optimization_results(n_rows, seed=0):
+    """Synthetic optimize_inventory_levels output with a mix of actions"""
+    rng = np.random.default_rng(seed)
+    reorder_point = rng.uniform(5, 100, n_rows)
+    return pd.DataFrame({
+        'product_id': np.arange(n_rows),
+        'current_quantity': rng.integers(0, 300, n_rows),
+        'eoq': rng.uniform(10, 500, n_rows),
+        'safety_stock': reorder_point * 0.3,
+        'reorder_point': reorder_point,
+        'current_reorder_point': rng.integers(5, 100, n_rows)
+    })
+
+def loop_recommendations(optimization_results):
+    """The previous row-by-row implementation, as the baseline"""
+    recommendations = []
+    for _, row in optimization_results.iterrows():
+        if row['current_quantity'] <= row['reorder_point']:
+            recommendations.append({
+                'product_id': row['product_id'],
+                'action': 'Reorder',
+                'current_quantity': row['current_quantity'],
+                'recommended_quantity': row['eoq'],
+                'reorder_point': row['reorder_point']
+            })
+        elif row['current_quantity'] > row['reorder_point'] * 2:
+            recommendations.append({
+                'product_id': row['product_id'],
+                'action': 'Reduce Stock',
+                'current_quantity': row['current_quantity'],
+                'recommended_quantity': row['reorder_point'] + row['safety_stock'],
+                'reorder_point': row['reorder_point']
+            })
+    return pd.DataFrame(recommendations)
+
+def timed(function, data):
+    start = time.perf_counter()
+    result = function(data)
+    return result, time.perf_counter() - start
+
+def run_benchmark(sizes=SIZES):
+    """Time both implementations per size and check they agree"""
+    rows = []
+    for n_rows in sizes:
+        data = make_optimization_results(n_rows)
+        expected, loop_seconds = timed(loop_recommendations, data)
+        result, vectorized_seconds = timed(generate_inventory_recommendations, data)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        rows.append({
+            'rows': n_rows,
+            'loop_seconds': loop_seconds,
+            'vectorized_seconds': vectorized_seconds,
+            'speedup': loop_seconds / vectorized_seconds
+        })
+    return pd.DataFrame(rows).set_index('rows')
+
+if __name__ == "__main__":
+    # python -m src.benchmarks.inventory_recommendations [rows ...]
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    print(run_benchmark(sizes).to_string(float_format=lambda value: f"{value:.4f}"))
@@ -0,0 +1,77 @@
+import logging
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from src.analysis.demand_forecasting import build_prophet_model, fit_forecast
+from src.analysis.model_store import warm_start_params
+
+def make_series(n_products=10, n_days=400, seed=0):
+    """Synthetic daily sales with trend, weekly season and noise"""
+    rng = np.random.default_rng(seed)
+    days = np.arange(n_days)
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=n_days, freq='D')
+    series = []
+    for _ in range(n_products):
+        level = rng.uniform(2, 20)
+        values = (level * (1 + 0.001 * days)
+                  + level * 0.3 * np.sin(2 * np.pi * days / 7)
+                  + rng.normal(0, level * 0.2, n_days))
+        series.append(pd.DataFrame({'ds': dates, 'y': np.clip(values, 0, None)}))
+    return series
+
+def time_fit(train, init=None):
+    """Time only the optimizer run of a Prophet fit"""
+    model = build_prophet_model(len(train))
+    start = time.perf_counter()
+    if init is not None:
+        model.fit(train, init=init)
+    else:
+        model.fit(train)
+    return time.perf_counter() - start
+
+def run_benchmark(n_products=10, n_days=400):
+    """
+    Compare a cold refit with a warm-started refit after one new day of sales
+
+    Each product is first fitted on all but its last day, as the previous
+    night's run would have; both refits then see the full series.
+    """
+    cold_fit, warm_fit, cold_total, warm_total = [], [], [], []
+    for df in make_series(n_products, n_days):
+        previous = fit_forecast(df.iloc[:-1])
+        if 'error' in previous:
+            raise RuntimeError(previous['error'])
+        init = previous['model_params']
+        train = df.iloc[:int(len(df) * 0.8)]
+
+        cold_fit.append(time_fit(train))
+        warm_fit.append(time_fit(train, init))
+
+        start = time.perf_counter()
+        fit_forecast(df)
+        cold_total.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        fit_forecast(df, init=init)
+        warm_total.append(time.perf_counter() - start)
+
+    return {
+        'cold_fit': np.mean(cold_fit),
+        'warm_fit': np.mean(warm_fit),
+        'cold_total': np.mean(cold_total),
+        'warm_total': np.mean(warm_total)
+    }
+
+if __name__ == "__main__":
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    logging.getLogger('prophet').setLevel(logging.WARNING)
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    result = run_benchmark(n_products)
+    print(f"Per product over {n_products} products:")
+    print(f"  optimizer   cold {result['cold_fit'] * 1000:8.1f} ms   "
+          f"warm {result['warm_fit'] * 1000:8.1f} ms   "
+          f"speedup {result['cold_fit'] / result['warm_fit']:.1f}x")
+    print(f"  fit_forecast cold {result['cold_total'] * 1000:8.1f} ms   "
+          f"warm {result['warm_total'] * 1000:8.1f} ms   "
+          f"speedup {result['cold_total'] / result['warm_total']:.1f}x")
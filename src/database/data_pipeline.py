@@ -1,3 +1,7 @@
+import io
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -14,6 +18,117 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Rows per DataFrame chunk when streaming large extracts
+DEFAULT_CHUNK_SIZE = 50000
+
+TRANSACTION_QUERY = text("""
+    SELECT 
+        t.transaction_id,
+        t.transaction_date,
+        t.customer_id,
+        t.store_id,
+        t.total_amount,
+        t.payment_method,
+        ti.product_id,
+        ti.quantity,
+        ti.unit_price
+    FROM transactions t
+    JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
+    WHERE (:since_id IS NULL OR t.transaction_id > :since_id)
+        AND (:until_id IS NULL OR t.transaction_id <= :until_id)
+    ORDER BY t.transaction_date DESC
+""")
+
+# Column dtypes applied to each pipeline dataset at extraction time.
+# 'integer' downcasts to the smallest integer type that holds the values
+# (a nullable Int type when the column has NULLs), and 'string' switches to
+# Arrow-backed strings when requested, otherwise the column is left as is.
+DATASET_SCHEMAS = {
+    'transaction_data': {
+        'transaction_id': 'integer',
+        'customer_id': 'integer',
+        'store_id': 'integer',
+        'product_id': 'integer',
+        'quantity': 'int32',
+        'total_amount': 'float32',
+        'unit_price': 'float32',
+        'payment_method': 'category'
+    },
+    'inventory_data': {
+        'inventory_id': 'integer',
+        'store_id': 'integer',
+        'product_id': 'integer',
+        'quantity': 'int32',
+        'reorder_point': 'integer',
+        'days_since_restock': 'integer',
+        'unit_cost': 'float32',
+        'unit_price': 'float32',
+        'total_value': 'float32',
+        'product_name': 'string',
+        'category': 'category',
+        'stock_status': 'category'
+    },
+    'product_data': {
+        'product_id': 'integer',
+        'reorder_point': 'integer',
+        'reorder_quantity': 'integer',
+        'unit_cost': 'float32',
+        'unit_price': 'float32',
+        'sku': 'string',
+        'name': 'string',
+        'description': 'string',
+        'category': 'category',
+        'subcategory': 'category'
+    },
+    'customer_data': {
+        'customer_id': 'integer',
+        'total_transactions': 'integer',
+        'first_name': 'string',
+        'last_name': 'string',
+        'email': 'string',
+        'phone': 'string'
+    }
+}
+
+def apply_schema(df, schema, arrow_strings=False):
+    """
+    Cast the columns of a DataFrame to the compact dtypes of a dataset schema
+    """
+    for column, dtype in schema.items():
+        if column not in df.columns or df.empty:
+            continue
+        if dtype == 'integer':
+            values = df[column]
+            if values.isna().any():
+                smallest = pd.to_numeric(values.dropna(), downcast='integer').dtype
+                df[column] = values.astype(smallest.name.capitalize())
+            else:
+                df[column] = pd.to_numeric(values, downcast='integer')
+        elif dtype == 'string':
+            if arrow_strings:
+                df[column] = df[column].astype('string[pyarrow]')
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+def stream_query(bind, query, params=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the result of a query as DataFrame chunks of at most chunk_size rows
+    
+    The rows are read through a server-side (named) cursor, so neither the
+    driver nor pandas ever holds more than one chunk of the result. An empty
+    result yields a single empty chunk that still carries the column names.
+    """
+    with bind.connect().execution_options(stream_results=True, yield_per=chunk_size) as conn:
+        result = conn.execute(query, params or {})
+        columns = list(result.keys())
+        empty = True
+        for rows in result.partitions(chunk_size):
+            empty = False
+            yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        if empty:
+            yield pd.DataFrame(columns=columns)
+
 class DataPipeline:
     def __init__(self, db: Session):
         self.db = db
@@ -150,90 +265,282 @@ class DataPipeline:
             logger.error(f"Error transforming inventory data: {e}")
             raise
     
-    def load_aggregated_data(self, data, table_name):
+    def load_aggregated_data(self, data, table_name, key_columns=None, batch_size=DEFAULT_CHUNK_SIZE):
         """
         Load aggregated data into the database
+        
+        On PostgreSQL the frame is streamed in batches through COPY FROM STDIN
+        into a temporary staging table, then merged with a single upsert.
+        Other backends fall back to batched executemany. Without key_columns
+        conflicting rows are skipped; with them they are updated in place.
+        Returns the load statistics, including throughput in rows/s.
         """
         try:
-            # Convert DataFrame to dictionary
-            records = data.to_dict('records')
+            start = time.perf_counter()
+            columns = list(data.columns)
+            conflict = self._conflict_clause(columns, key_columns)
             
-            # Insert records
-            for record in records:
-                # Create column list and values list
-                columns = list(record.keys())
-                values = [record[col] for col in columns]
-                
-                # Create the SQL query with named parameters
-                query = f"""
+            if self.db.bind.dialect.driver == 'psycopg2':
+                method = 'copy'
+                self._copy_upsert(
+                    self.db.connection().connection, data, table_name,
+                    columns, conflict, batch_size
+                )
+            else:
+                method = 'executemany'
+                query = text(f"""
                     INSERT INTO {table_name} 
                     ({', '.join(columns)})
                     VALUES ({', '.join([f':{col}' for col in columns])})
-                    ON CONFLICT DO NOTHING
-                """
-                
-                # Execute with named parameters
-                self.db.execute(text(query), record)
+                    {conflict}
+                """)
+                for offset in range(0, len(data), batch_size):
+                    batch = data.iloc[offset:offset + batch_size]
+                    records = batch.astype(object).where(batch.notna(), None).to_dict('records')
+                    self.db.execute(query, records)
             
             self.db.commit()
-            logger.info(f"Successfully loaded {len(records)} records into {table_name}")
+            elapsed = time.perf_counter() - start
+            rows_per_second = len(data) / elapsed if elapsed > 0 else float('inf')
+            logger.info(
+                f"Successfully loaded {len(data)} records into {table_name} via {method} "
+                f"in {elapsed:.2f}s ({rows_per_second:,.0f} rows/s)"
+            )
+            return {
+                'rows': len(data),
+                'seconds': elapsed,
+                'rows_per_second': rows_per_second,
+                'method': method
+            }
         except Exception as e:
             logger.error(f"Error loading data into {table_name}: {e}")
             self.db.rollback()
             raise
     
-    def run_pipeline(self):
-        """Run the complete data pipeline"""
+    @staticmethod
+    def _conflict_clause(columns, key_columns=None):
+        """Build the ON CONFLICT clause of the merge statement"""
+        if not key_columns:
+            return "ON CONFLICT DO NOTHING"
+        updates = [f"{col} = EXCLUDED.{col}" for col in columns if col not in key_columns]
+        if not updates:
+            return f"ON CONFLICT ({', '.join(key_columns)}) DO NOTHING"
+        return f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {', '.join(updates)}"
+    
+    @staticmethod
+    def _copy_upsert(dbapi_conn, data, table_name, columns, conflict, batch_size):
+        """COPY a frame into a staging table and merge it into table_name"""
+        # A unique temporary name, so no other table can be touched and
+        # concurrent loads of the same table do not collide
+        staging = f"pg_temp.staging_{uuid.uuid4().hex}"
+        column_list = ', '.join(columns)
+        cursor = dbapi_conn.cursor()
+        try:
+            cursor.execute(f"""
+                CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+                SELECT {column_list} FROM {table_name} WITH NO DATA
+            """)
+            for offset in range(0, len(data), batch_size):
+                buffer = io.StringIO()
+                data.iloc[offset:offset + batch_size].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer
+                )
+            cursor.execute(f"""
+                INSERT INTO {table_name} ({column_list})
+                SELECT {column_list} FROM {staging}
+                {conflict}
+            """)
+        finally:
+            cursor.close()
+    
+    def get_watermarks(self):
+        """
+        Get the current high-water mark of each pipeline dataset
+        """
+        query = text("""
+            SELECT
+                (SELECT MAX(transaction_id) FROM transactions) as transaction_id,
+                (SELECT MAX(updated_at) FROM inventory) as inventory_updated_at,
+                (SELECT MAX(updated_at) FROM products) as product_updated_at,
+                (SELECT MAX(updated_at) FROM customers) as customer_updated_at
+        """)
+        return dict(self.db.execute(query).mappings().one())
+    
+    def run_pipeline(self, previous=None, chunk_size=DEFAULT_CHUNK_SIZE, concurrent=False,
+                     arrow_strings=False):
+        """
+        Run the complete data pipeline
+        
+        When ``previous`` is the result of an earlier run, only rows added or
+        changed since that run's watermarks are fetched and merged into its
+        frames. Deleted rows are not detected; do a full load to drop them.
+        Transaction rows are streamed in chunks of ``chunk_size`` and
+        compacted chunk by chunk, but the returned frame holds the whole
+        extract; code that can fold over the rows should read
+        stream_transaction_data instead.
+        
+        With ``concurrent`` the four extraction queries run on a thread pool,
+        each on its own pooled connection from the engine, so the load takes
+        as long as the slowest query instead of the sum of all four. The
+        seconds spent in each query are returned under ``timings``.
+        
+        Every frame is cast to its DATASET_SCHEMAS dtypes as it is extracted,
+        with Arrow-backed strings when ``arrow_strings`` is set. The bytes
+        before and after are returned under ``memory``.
+        """
         try:
             logger.info("Starting data pipeline...")
             
-            logger.info("Getting transaction data...")
-            transaction_data = self._get_transaction_data()
-            logger.info(f"Retrieved {len(transaction_data)} transaction records")
+            watermarks = self.get_watermarks()
+            last = previous.get('watermarks') if previous else None
+            if last:
+                logger.info(f"Running incremental load since {last}")
+            else:
+                last = {}
+                previous = {}
             
-            logger.info("Getting inventory data...")
-            inventory_data = self._get_inventory_data()
-            logger.info(f"Retrieved {len(inventory_data)} inventory records")
+            extractions = {
+                'transaction_data': lambda: self._get_transaction_data(
+                    since_id=last.get('transaction_id'),
+                    until_id=watermarks['transaction_id'],
+                    chunk_size=chunk_size,
+                    arrow_strings=arrow_strings
+                ),
+                'inventory_data': lambda: self._get_inventory_data(
+                    since=last.get('inventory_updated_at'),
+                    product_since=last.get('product_updated_at')
+                ),
+                'product_data': lambda: self._get_product_data(
+                    since=last.get('product_updated_at')
+                ),
+                'customer_data': lambda: self._get_customer_data(
+                    since=last.get('customer_updated_at'),
+                    since_transaction_id=last.get('transaction_id')
+                )
+            }
             
-            logger.info("Getting product data...")
-            product_data = self._get_product_data()
-            logger.info(f"Retrieved {len(product_data)} product records")
+            if concurrent:
+                logger.info("Getting pipeline data concurrently...")
+                with ThreadPoolExecutor(max_workers=len(extractions)) as executor:
+                    futures = {
+                        name: executor.submit(self._timed, extract)
+                        for name, extract in extractions.items()
+                    }
+                    results = {name: future.result() for name, future in futures.items()}
+            else:
+                logger.info("Getting pipeline data...")
+                results = {name: self._timed(extract) for name, extract in extractions.items()}
             
-            logger.info("Getting customer data...")
-            customer_data = self._get_customer_data()
-            logger.info(f"Retrieved {len(customer_data)} customer records")
+            timings = {name: result[1] for name, result in results.items()}
+            memory = {}
+            deltas = {}
+            for name, (delta, _) in results.items():
+                # Transaction chunks are already compacted as they stream in
+                before = delta.attrs.get('raw_bytes', int(delta.memory_usage(deep=True).sum()))
+                deltas[name] = apply_schema(delta, DATASET_SCHEMAS[name], arrow_strings)
+                after = int(deltas[name].memory_usage(deep=True).sum())
+                memory[name] = {'before': before, 'after': after, 'saved': before - after}
+            for name, delta in deltas.items():
+                logger.info(f"Retrieved {len(delta)} {name} records in {timings[name]:.2f}s")
             
-            logger.info("Data pipeline completed successfully")
-            return {
+            transaction_data = self._append_delta(
+                previous.get('transaction_data'), deltas['transaction_data']
+            )
+            inventory_data = self._add_inventory_metrics(self._merge_delta(
+                previous.get('inventory_data'), deltas['inventory_data'], 'inventory_id'
+            ))
+            product_data = self._merge_delta(
+                previous.get('product_data'), deltas['product_data'], 'product_id'
+            )
+            customer_data = self._merge_delta(
+                previous.get('customer_data'), deltas['customer_data'], 'customer_id'
+            )
+            
+            data = {
                 'transaction_data': transaction_data,
                 'inventory_data': inventory_data,
                 'product_data': product_data,
                 'customer_data': customer_data
             }
+            # Merging with a previous result can widen dtypes again
+            # (e.g. categoricals with different categories), and the
+            # inventory metrics are recomputed after the merge
+            for name, df in data.items():
+                apply_schema(df, DATASET_SCHEMAS[name], arrow_strings)
+            
+            saved = sum(report['saved'] for report in memory.values())
+            logger.info(f"Compact dtypes saved {saved / 1024 ** 2:.1f} MiB")
+            logger.info("Data pipeline completed successfully")
+            return {
+                **data,
+                'watermarks': watermarks,
+                'timings': timings,
+                'memory': memory
+            }
         except Exception as e:
             logger.error(f"Error in data pipeline: {str(e)}")
             raise
     
-    def _get_transaction_data(self):
-        """Get transaction data"""
-        query = text("""
-            SELECT 
-                t.transaction_id,
-                t.transaction_date,
-                t.customer_id,
-                t.store_id,
-                t.total_amount,
-                ti.product_id,
-                ti.quantity,
-                ti.unit_price
-            FROM transactions t
-            JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
-            ORDER BY t.transaction_date DESC
-        """)
-        return pd.read_sql(query, self.db.bind)
+    @staticmethod
+    def _timed(extract):
+        """Run an extraction and return its result with the seconds it took"""
+        start = time.perf_counter()
+        result = extract()
+        return result, time.perf_counter() - start
+    
+    @staticmethod
+    def _append_delta(previous, delta):
+        """Prepend newly arrived rows to a previously loaded append-only frame"""
+        if previous is None or previous.empty:
+            return delta
+        if delta.empty:
+            return previous
+        return pd.concat([delta, previous], ignore_index=True)
     
-    def _get_inventory_data(self):
-        """Get inventory data"""
+    @staticmethod
+    def _merge_delta(previous, delta, key):
+        """Replace rows of a previously loaded frame by key with changed rows"""
+        if previous is None or previous.empty:
+            return delta
+        if delta.empty:
+            return previous
+        unchanged = previous[~previous[key].isin(delta[key])]
+        return pd.concat([delta, unchanged], ignore_index=True)
+    
+    def stream_transaction_data(self, chunk_size=DEFAULT_CHUNK_SIZE, since_id=None, until_id=None):
+        """
+        Yield transaction data in DataFrame chunks, optionally bounded to a
+        transaction_id window
+        """
+        yield from stream_query(
+            self.db.bind, TRANSACTION_QUERY,
+            {'since_id': since_id, 'until_id': until_id},
+            chunk_size=chunk_size
+        )
+    
+    def _get_transaction_data(self, since_id=None, until_id=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                              arrow_strings=False):
+        """
+        Get transaction data, optionally bounded to a transaction_id window
+        
+        The whole extract is returned as one frame, so it is held in memory;
+        but each streamed chunk is cast to the compact dtypes before it is
+        kept, so the extract never exists with the driver's wide dtypes.
+        The bytes of the chunks before the cast are in ``attrs['raw_bytes']``.
+        """
+        chunks = []
+        raw_bytes = 0
+        for chunk in self.stream_transaction_data(chunk_size, since_id, until_id):
+            raw_bytes += int(chunk.memory_usage(deep=True).sum())
+            chunks.append(apply_schema(chunk, DATASET_SCHEMAS['transaction_data'], arrow_strings))
+        df = pd.concat(chunks, ignore_index=True)
+        df.attrs['raw_bytes'] = raw_bytes
+        return df
+    
+    def _get_inventory_data(self, since=None, product_since=None):
+        """Get inventory data, optionally only rows changed since a watermark"""
         try:
             logger.info("Fetching inventory data...")
             query = text("""
@@ -251,13 +558,19 @@ class DataPipeline:
                     (i.quantity * p.unit_cost) as total_value
                 FROM inventory i
                 JOIN products p ON i.product_id = p.product_id
+                WHERE (:since IS NULL OR i.updated_at > :since
+                       OR (:product_since IS NOT NULL AND p.updated_at > :product_since))
                 ORDER BY i.store_id, p.category, p.name
             """)
             
-            df = pd.read_sql(query, self.db.bind)
+            df = pd.read_sql(
+                query, self.db.bind,
+                params={'since': since, 'product_since': product_since}
+            )
             
             if df.empty:
-                logger.warning("No inventory data found")
+                if since is None:
+                    logger.warning("No inventory data found")
                 return pd.DataFrame(columns=[
                     'inventory_id', 'store_id', 'product_id', 'quantity',
                     'last_restocked', 'product_name', 'category', 'unit_cost',
@@ -267,12 +580,8 @@ class DataPipeline:
             # Convert last_restocked to datetime
             df['last_restocked'] = pd.to_datetime(df['last_restocked'])
             
-            # Calculate additional metrics
-            df['days_since_restock'] = (datetime.now() - df['last_restocked']).dt.days
-            df['stock_status'] = np.where(df['quantity'] <= df['reorder_point'], 'Low', 'Adequate')
-            
-            # Ensure numeric columns are float
-            numeric_cols = ['quantity', 'unit_cost', 'unit_price', 'total_value']
+            # Ensure money columns are float
+            numeric_cols = ['unit_cost', 'unit_price', 'total_value']
             df[numeric_cols] = df[numeric_cols].astype(float)
             
             logger.info(f"Retrieved {len(df)} inventory records")
@@ -283,8 +592,17 @@ class DataPipeline:
             logger.error(f"Error getting inventory data: {str(e)}")
             raise
     
-    def _get_product_data(self):
-        """Get product data"""
+    @staticmethod
+    def _add_inventory_metrics(df):
+        """Calculate time-dependent inventory metrics over the merged frame"""
+        if df.empty:
+            return df
+        df['days_since_restock'] = (datetime.now() - df['last_restocked']).dt.days
+        df['stock_status'] = np.where(df['quantity'] <= df['reorder_point'], 'Low', 'Adequate')
+        return df
+    
+    def _get_product_data(self, since=None):
+        """Get product data, optionally only rows changed since a watermark"""
         query = text("""
             SELECT 
                 p.product_id,
@@ -298,11 +616,15 @@ class DataPipeline:
                 p.reorder_point,
                 p.reorder_quantity
             FROM products p
+            WHERE (:since IS NULL OR p.updated_at > :since)
         """)
-        return pd.read_sql(query, self.db.bind)
+        return pd.read_sql(query, self.db.bind, params={'since': since})
     
-    def _get_customer_data(self):
-        """Get customer data"""
+    def _get_customer_data(self, since=None, since_transaction_id=None):
+        """
+        Get customer data, optionally only customers changed since a watermark
+        or with transactions newer than ``since_transaction_id``
+        """
         query = text("""
             SELECT 
                 c.customer_id,
@@ -314,17 +636,26 @@ class DataPipeline:
                 SUM(t.total_amount) as total_spent
             FROM customers c
             LEFT JOIN transactions t ON c.customer_id = t.customer_id
+            WHERE :since IS NULL
+                OR c.updated_at > :since
+                OR c.customer_id IN (
+                    SELECT customer_id FROM transactions
+                    WHERE transaction_id > :since_transaction_id
+                )
             GROUP BY c.customer_id, c.first_name, c.last_name, c.email, c.phone
         """)
-        return pd.read_sql(query, self.db.bind)
+        return pd.read_sql(
+            query, self.db.bind,
+            params={'since': since, 'since_transaction_id': since_transaction_id}
+        )
 
-def run_data_pipeline():
+def run_data_pipeline(previous=None, concurrent=True):
     """
-    Run the data pipeline
+    Run the data pipeline, incrementally when a previous result is given
     """
     db = next(get_db())
     try:
         pipeline = DataPipeline(db)
-        return pipeline.run_pipeline()
+        return pipeline.run_pipeline(previous=previous, concurrent=concurrent)
     finally:
         db.close() 
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import threading
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
@@ -6,15 +7,27 @@ from sqlalchemy.orm import sessionmaker
 import logging
 import sys
 
-# Load environment variables
-load_dotenv()
-
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Connection pool settings, overridable through the environment or
+# configure_engine() before the engine is first used
+DEFAULT_POOL_OPTIONS = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_timeout': 30,
+    'pool_recycle': 1800,
+}
+
+_engine = None
+_session_factory = None
+_pool_options = {}
+_lock = threading.Lock()
+
 def get_db_url():
     """Get database URL from environment variables"""
+    # Load environment variables
+    load_dotenv()
+
     # Get environment variables with explicit defaults
     db_user = os.environ.get('DB_USER', 'retail_user')
     db_password = os.environ.get('DB_PASSWORD', 'retail_password')
@@ -23,40 +36,79 @@ def get_db_url():
     db_host = 'localhost' if is_script else os.environ.get('DB_HOST', 'postgres')
     db_port = os.environ.get('DB_PORT', '5432')
     db_name = os.environ.get('DB_NAME', 'retail_analytics')
-    
+
     # Log the connection details (excluding password)
-    logger.info(f"Database connection details:")
-    logger.info(f"User: {db_user}")
-    logger.info(f"Host: {db_host}")
-    logger.info(f"Port: {db_port}")
-    logger.info(f"Database: {db_name}")
-    logger.info(f"Running as script: {is_script}")
-    
+    logger.info(
+        f"Database connection details: user={db_user} host={db_host} port={db_port} "
+        f"database={db_name} running_as_script={is_script}"
+    )
+
     url = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
     return url
 
-# Create database engine with connection pooling and retry settings
-engine = create_engine(
-    get_db_url(),
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-    pool_pre_ping=True,  # Enable connection health checks
-    connect_args={
-        "connect_timeout": 10  # Connection timeout in seconds
-    }
-)
-
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_pool_options():
+    """Get the connection pool settings for the engine"""
+    options = {}
+    for name, default in DEFAULT_POOL_OPTIONS.items():
+        options[name] = int(os.environ.get(f'DB_{name.upper()}', default))
+    options.update(_pool_options)
+    return options
+
+def configure_engine(**pool_options):
+    """
+    Set connection pool options (pool_size, max_overflow, pool_timeout,
+    pool_recycle) for the engine; an existing engine is disposed and
+    recreated with them on next use
+    """
+    global _engine, _session_factory
+    with _lock:
+        _pool_options.update(pool_options)
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _session_factory = None
+
+def get_engine():
+    """Get the database engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                # Create database engine with connection pooling and retry settings
+                _engine = create_engine(
+                    get_db_url(),
+                    pool_pre_ping=True,  # Enable connection health checks
+                    connect_args={
+                        "connect_timeout": 10  # Connection timeout in seconds
+                    },
+                    **get_pool_options()
+                )
+    return _engine
+
+def get_session_factory():
+    """Get the session factory bound to the engine, creating it on first use"""
+    global _session_factory
+    if _session_factory is None:
+        engine = get_engine()
+        with _lock:
+            if _session_factory is None:
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return _session_factory
+
+def __getattr__(name):
+    # `engine` and `SessionLocal` are created lazily on first access
+    if name == 'engine':
+        return get_engine()
+    if name == 'SessionLocal':
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Create base class for models
 Base = declarative_base()
 
 def get_db():
     """Get database session"""
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         # Test the connection using SQLAlchemy text()
         db.execute(text("SELECT 1"))
@@ -71,7 +123,7 @@ def get_db():
 def init_db():
     """Initialize the database by creating all tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
         logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {str(e)}")
@@ -79,9 +131,13 @@ def init_db():
 
 def close_db():
     """Close the database connection"""
+    global _engine, _session_factory
     try:
-        engine.dispose()
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            _session_factory = None
         logger.info("Database connections closed")
     except Exception as e:
         logger.error(f"Error closing database connections: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
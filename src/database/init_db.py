@@ -2,9 +2,11 @@ import os
 from dotenv import load_dotenv
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from .db_connection import engine, Base, get_db_url
+from .db_connection import Base, get_db_url
 from .models import *
 from .sample_data import generate_sample_data
+from .rollups import refresh_daily_sales
+from .migrations import apply_migrations
 
 def init_database():
     """Initialize database with tables and sample data"""
@@ -38,6 +40,10 @@ def init_database():
         Base.metadata.create_all(engine)
         print("Tables created successfully")
         
+        # Record the schema version so later migrations apply on top of it
+        print("Applying schema migrations...")
+        apply_migrations(engine)
+        
         # Create session
         print("Creating database session...")
         Session = sessionmaker(bind=engine)
@@ -53,6 +59,10 @@ def init_database():
             db.commit()
             print("Changes committed successfully")
             
+            # Build the daily sales rollup
+            print("Refreshing daily sales rollup...")
+            refresh_daily_sales(db, full=True)
+            
             print("Database initialized successfully!")
             print("Generated data summary:")
             for key, value in result.items():
@@ -0,0 +1,324 @@
+import logging
+import sys
+from sqlalchemy import text
+from .db_connection import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Tables of the daily sales rollup (see rollups.py), which databases
+# created from the original schema.sql do not have
+ROLLUP_TABLES = [
+    """CREATE TABLE IF NOT EXISTS daily_product_store_sales (
+           date DATE NOT NULL,
+           store_id INTEGER REFERENCES stores (store_id),
+           product_id INTEGER REFERENCES products (product_id),
+           units INTEGER NOT NULL DEFAULT 0,
+           revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+           transactions INTEGER NOT NULL DEFAULT 0,
+           updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+           PRIMARY KEY (date, store_id, product_id)
+       )""",
+    """CREATE TABLE IF NOT EXISTS rollup_state (
+           name VARCHAR(100) PRIMARY KEY,
+           last_transaction_item_id INTEGER NOT NULL DEFAULT 0,
+           refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+       )""",
+]
+
+# Composite and covering indexes for the hot query paths of the analysis
+# package, also reused when tables are rebuilt (see partitioning.py).
+# Covering indexes get their own names, since an existing plain index of
+# the same name would turn IF NOT EXISTS into a no-op.
+HOT_PATH_INDEXES = [
+    # Date-bounded scans in every analysis module
+    """CREATE INDEX IF NOT EXISTS idx_transactions_date_covering
+       ON transactions (transaction_date)
+       INCLUDE (transaction_id, store_id, customer_id)""",
+    # RFM aggregation per customer
+    """CREATE INDEX IF NOT EXISTS idx_transactions_customer_date
+       ON transactions (customer_id, transaction_date)
+       INCLUDE (total_amount)""",
+    # transactions -> transaction_items joins
+    """CREATE INDEX IF NOT EXISTS idx_transaction_items_transaction_covering
+       ON transaction_items (transaction_id)
+       INCLUDE (product_id, quantity, unit_price)""",
+    # Per-product sales history and co-purchase lookups
+    """CREATE INDEX IF NOT EXISTS idx_transaction_items_product
+       ON transaction_items (product_id, transaction_id)
+       INCLUDE (quantity)""",
+    # One inventory row per store and product
+    """CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_store_product
+       ON inventory (store_id, product_id)""",
+    # Per-product reads of the daily sales rollup
+    """CREATE INDEX IF NOT EXISTS idx_daily_sales_product_date
+       ON daily_product_store_sales (product_id, date)
+       INCLUDE (store_id, units)""",
+]
+
+# Versioned schema migrations, applied in order and recorded in
+# schema_migrations. Each step is a list of SQL statements or callables
+# taking a connection; every step must be safe on databases created by
+# Base.metadata.create_all, which already declares the same objects.
+MIGRATIONS = [
+    (1, 'hot path indexes', ROLLUP_TABLES + HOT_PATH_INDEXES + [
+        "ANALYZE transactions",
+        "ANALYZE transaction_items",
+        "ANALYZE inventory",
+        "ANALYZE daily_product_store_sales",
+    ]),
+    (2, 'transaction date on transaction items', [
+        # Copy of the parent transaction's date, so line items can be
+        # filtered and partitioned by time without joining transactions
+        """ALTER TABLE transaction_items
+           ADD COLUMN IF NOT EXISTS transaction_date TIMESTAMP WITH TIME ZONE""",
+        """UPDATE transaction_items ti
+           SET transaction_date = t.transaction_date
+           FROM transactions t
+           WHERE ti.transaction_id = t.transaction_id
+               AND ti.transaction_date IS NULL""",
+        """CREATE INDEX IF NOT EXISTS idx_transaction_items_date
+           ON transaction_items (transaction_date)""",
+    ]),
+    (3, 'batch forecasts', [
+        """CREATE TABLE IF NOT EXISTS forecasts (
+               product_id INTEGER REFERENCES products (product_id),
+               date DATE NOT NULL,
+               yhat DOUBLE PRECISION NOT NULL,
+               yhat_lower DOUBLE PRECISION,
+               yhat_upper DOUBLE PRECISION,
+               trend DOUBLE PRECISION,
+               fit_seconds DOUBLE PRECISION,
+               generated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+               PRIMARY KEY (product_id, date)
+           )""",
+    ]),
+    (4, 'forecast cache', [
+        """CREATE TABLE IF NOT EXISTS forecast_cache (
+               cache_key VARCHAR(64) PRIMARY KEY,
+               product_id INTEGER NOT NULL REFERENCES products (product_id),
+               forecast_periods INTEGER NOT NULL,
+               watermark VARCHAR(200) NOT NULL,
+               result BYTEA NOT NULL,
+               created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+               last_used_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+           )""",
+        """CREATE INDEX IF NOT EXISTS ix_forecast_cache_product_id
+           ON forecast_cache (product_id)""",
+        """CREATE INDEX IF NOT EXISTS idx_forecast_cache_last_used
+           ON forecast_cache (last_used_at)""",
+    ]),
+    (5, 'forecast model store', [
+        """CREATE TABLE IF NOT EXISTS forecast_models (
+               product_id INTEGER PRIMARY KEY REFERENCES products (product_id),
+               params TEXT NOT NULL,
+               fitted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+           )""",
+    ]),
+    (6, 'precomputed product forecasts', [
+        """CREATE TABLE IF NOT EXISTS product_forecasts (
+               product_id INTEGER PRIMARY KEY REFERENCES products (product_id),
+               engine VARCHAR(50) NOT NULL,
+               forecast_periods INTEGER NOT NULL,
+               forecast TEXT NOT NULL,
+               mae DOUBLE PRECISION,
+               mape DOUBLE PRECISION,
+               rmse DOUBLE PRECISION,
+               r2 DOUBLE PRECISION,
+               seasonality TEXT,
+               fit_seconds DOUBLE PRECISION,
+               generated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+           )""",
+    ]),
+    (7, 'covering indexes under their own names', [
+        # Migration 1 created these under the names of the plain indexes of
+        # the original schema.sql, so it skipped them on such databases;
+        # the covering indexes make the plain ones redundant
+        "DROP INDEX IF EXISTS idx_transactions_date",
+        "DROP INDEX IF EXISTS idx_transaction_items_transaction",
+    ] + [step for step in HOT_PATH_INDEXES if '_covering' in step] + [
+        "ANALYZE transactions",
+        "ANALYZE transaction_items",
+    ]),
+    (8, 'required transaction item dates', [
+        # Line items inserted without a date take their transaction's, so
+        # filters on transaction_items.transaction_date see every row. On
+        # partitioned tables rows are routed before the trigger runs, so
+        # inserts there have to supply the date (the ORM does).
+        """CREATE OR REPLACE FUNCTION set_transaction_item_date() RETURNS trigger AS $$
+           BEGIN
+               IF NEW.transaction_date IS NULL THEN
+                   SELECT transaction_date INTO NEW.transaction_date
+                   FROM transactions
+                   WHERE transaction_id = NEW.transaction_id;
+               END IF;
+               RETURN NEW;
+           END
+           $$ LANGUAGE plpgsql""",
+        "DROP TRIGGER IF EXISTS trg_transaction_items_date ON transaction_items",
+        """CREATE TRIGGER trg_transaction_items_date
+           BEFORE INSERT ON transaction_items
+           FOR EACH ROW EXECUTE FUNCTION set_transaction_item_date()""",
+        """UPDATE transaction_items ti
+           SET transaction_date = t.transaction_date
+           FROM transactions t
+           WHERE ti.transaction_id = t.transaction_id
+               AND ti.transaction_date IS NULL""",
+        "ALTER TABLE transaction_items ALTER COLUMN transaction_date SET NOT NULL",
+    ]),
+    (9, 'forecast cache as JSON', [
+        # Entries were pickled before; drop them rather than ever unpickle
+        "DELETE FROM forecast_cache",
+        "ALTER TABLE forecast_cache ALTER COLUMN result TYPE TEXT USING NULL",
+    ]),
+]
+
+# Key queries of the analysis package, the index each one should use and
+# the columns that index has to include
+KEY_QUERIES = {
+    'transactions_by_date': (
+        "SELECT transaction_id, customer_id FROM transactions "
+        "WHERE transaction_date >= NOW() - INTERVAL '90 days'",
+        'idx_transactions_date_covering',
+        ['transaction_id', 'store_id', 'customer_id']
+    ),
+    'customer_rfm': (
+        "SELECT customer_id, MAX(transaction_date), SUM(total_amount) FROM transactions "
+        "WHERE customer_id = 1 GROUP BY customer_id",
+        'idx_transactions_customer_date',
+        ['total_amount']
+    ),
+    'items_by_transaction': (
+        "SELECT product_id, quantity FROM transaction_items WHERE transaction_id = 1",
+        'idx_transaction_items_transaction_covering',
+        ['product_id', 'quantity', 'unit_price']
+    ),
+    'items_by_product': (
+        "SELECT transaction_id, quantity FROM transaction_items WHERE product_id = 1",
+        'idx_transaction_items_product',
+        ['quantity']
+    ),
+    'inventory_by_store_product': (
+        "SELECT quantity FROM inventory WHERE store_id = 1 AND product_id = 1",
+        'uq_inventory_store_product',
+        []
+    ),
+    'daily_sales_by_product': (
+        "SELECT date, units FROM daily_product_store_sales WHERE product_id = 1",
+        'idx_daily_sales_product_date',
+        ['store_id', 'units']
+    ),
+}
+
+def _ensure_migrations_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+
+def get_schema_version(bind=None):
+    """Get the latest applied migration version, 0 for a new database"""
+    with (bind or get_engine()).begin() as conn:
+        _ensure_migrations_table(conn)
+        return conn.execute(
+            text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        ).scalar()
+
+def apply_migrations(bind=None, target=None):
+    """
+    Apply pending migrations up to ``target`` (all by default)
+
+    Each migration runs in its own transaction together with its
+    schema_migrations record, so an existing database is upgraded in
+    place without dropping any data. Returns the applied versions.
+    """
+    applied = []
+    current = get_schema_version(bind)
+    for version, name, steps in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        logger.info(f"Applying migration {version}: {name}")
+        try:
+            with (bind or get_engine()).begin() as conn:
+                for step in steps:
+                    if callable(step):
+                        step(conn)
+                    else:
+                        conn.execute(text(step))
+                conn.execute(
+                    text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                    {'version': version, 'name': name}
+                )
+        except Exception as e:
+            logger.error(f"Error applying migration {version}: {str(e)}")
+            raise
+        applied.append(version)
+    return applied
+
+def _plan_indexes(plan):
+    """Collect the index names used anywhere in an EXPLAIN JSON plan"""
+    indexes = set()
+    if 'Index Name' in plan:
+        indexes.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        indexes |= _plan_indexes(child)
+    return indexes
+
+def _included_columns(conn, index):
+    """Get the INCLUDE (non-key) columns of an index"""
+    return set(conn.execute(text("""
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indexrelid AND a.attnum > i.indnkeyatts
+        WHERE i.indexrelid = to_regclass(:index)
+    """), {'index': index}).scalars().all())
+
+def verify_index_usage(bind=None):
+    """
+    Check with EXPLAIN that each key query can be served by its index, and
+    that the index includes the columns it is meant to cover
+
+    Sequential scans are disabled for the check, since on small tables the
+    planner prefers them regardless of the available indexes.
+    """
+    results = {}
+    with (bind or get_engine()).connect() as conn:
+        with conn.begin():
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+            # Partitions use their own copies of an index; map them to the
+            # index declared on the partitioned parent table
+            parents = dict(conn.execute(text("""
+                SELECT c.relname, p.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE c.relkind = 'i'
+            """)).all())
+            for name, (query, expected, include) in KEY_QUERIES.items():
+                plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {query}")).scalar()
+                used = _plan_indexes(plan[0]['Plan'])
+                used |= {parents[index] for index in used if index in parents}
+                missing = sorted(set(include) - _included_columns(conn, expected))
+                results[name] = {
+                    'expected_index': expected,
+                    'indexes_used': sorted(used),
+                    'missing_columns': missing,
+                    'uses_index': expected in used and not missing
+                }
+    return results
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    versions = apply_migrations()
+    print(f"Applied migrations: {versions or 'none'}")
+    print(f"Schema version: {get_schema_version()}")
+    if '--verify' in sys.argv:
+        failed = False
+        for name, result in verify_index_usage().items():
+            status = 'OK' if result['uses_index'] else 'MISSING'
+            failed = failed or not result['uses_index']
+            print(f"{status:8} {name}: uses {result['indexes_used']}"
+                  + (f", missing INCLUDE {result['missing_columns']}" if result['missing_columns'] else ""))
+        sys.exit(1 if failed else 0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Enum
+from sqlalchemy import event, select, Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Enum, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db_connection import Base
@@ -79,6 +79,9 @@ class Staff(Base):
 
 class Inventory(Base):
     __tablename__ = "inventory"
+    __table_args__ = (
+        Index("uq_inventory_store_product", "store_id", "product_id", unique=True),
+    )
 
     inventory_id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.store_id"))
@@ -93,6 +96,12 @@ class Inventory(Base):
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("idx_transactions_date_covering", "transaction_date",
+              postgresql_include=["transaction_id", "store_id", "customer_id"]),
+        Index("idx_transactions_customer_date", "customer_id", "transaction_date",
+              postgresql_include=["total_amount"]),
+    )
 
     transaction_id = Column(Integer, primary_key=True, index=True)
     store_id = Column(Integer, ForeignKey("stores.store_id"))
@@ -110,6 +119,13 @@ class Transaction(Base):
 
 class TransactionItem(Base):
     __tablename__ = "transaction_items"
+    __table_args__ = (
+        Index("idx_transaction_items_transaction_covering", "transaction_id",
+              postgresql_include=["product_id", "quantity", "unit_price"]),
+        Index("idx_transaction_items_product", "product_id", "transaction_id",
+              postgresql_include=["quantity"]),
+        Index("idx_transaction_items_date", "transaction_date"),
+    )
 
     transaction_item_id = Column(Integer, primary_key=True, index=True)
     transaction_id = Column(Integer, ForeignKey("transactions.transaction_id"))
@@ -117,11 +133,28 @@ class TransactionItem(Base):
     quantity = Column(Integer, nullable=False)
     unit_price = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
+    transaction_date = Column(DateTime(timezone=True), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     transaction = relationship("Transaction", back_populates="items")
     product = relationship("Product", back_populates="transaction_items")
 
+@event.listens_for(TransactionItem, "before_insert")
+def _copy_transaction_date(mapper, connection, target):
+    """Fill a line item's transaction_date from its transaction"""
+    if target.transaction_date is not None:
+        return
+    # Use a loaded parent rather than lazy loading it during the flush
+    transaction = target.__dict__.get("transaction")
+    if transaction is not None:
+        target.transaction_date = transaction.transaction_date
+    elif target.transaction_id is not None:
+        target.transaction_date = connection.execute(
+            select(Transaction.transaction_date).where(
+                Transaction.transaction_id == target.transaction_id
+            )
+        ).scalar()
+
 class Promotion(Base):
     __tablename__ = "promotions"
 
@@ -145,4 +178,74 @@ class ProductPromotion(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     promotion = relationship("Promotion", back_populates="products")
-    product = relationship("Product", back_populates="promotions") 
\ No newline at end of file
+    product = relationship("Product", back_populates="promotions") 
+
+class DailyProductStoreSales(Base):
+    __tablename__ = "daily_product_store_sales"
+    __table_args__ = (
+        Index("idx_daily_sales_product_date", "product_id", "date",
+              postgresql_include=["store_id", "units"]),
+    )
+
+    date = Column(Date, primary_key=True)
+    store_id = Column(Integer, ForeignKey("stores.store_id"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    transactions = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RollupState(Base):
+    __tablename__ = "rollup_state"
+
+    name = Column(String(100), primary_key=True)
+    last_transaction_item_id = Column(Integer, nullable=False, default=0)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class Forecast(Base):
+    __tablename__ = "forecasts"
+
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    yhat = Column(Float, nullable=False)
+    yhat_lower = Column(Float)
+    yhat_upper = Column(Float)
+    trend = Column(Float)
+    fit_seconds = Column(Float)
+    generated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ForecastCache(Base):
+    __tablename__ = "forecast_cache"
+    __table_args__ = (
+        Index("idx_forecast_cache_last_used", "last_used_at"),
+    )
+
+    cache_key = Column(String(64), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.product_id"), nullable=False, index=True)
+    forecast_periods = Column(Integer, nullable=False)
+    watermark = Column(String(200), nullable=False)
+    result = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ForecastModel(Base):
+    __tablename__ = "forecast_models"
+
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    params = Column(Text, nullable=False)
+    fitted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ProductForecast(Base):
+    __tablename__ = "product_forecasts"
+
+    product_id = Column(Integer, ForeignKey("products.product_id"), primary_key=True)
+    engine = Column(String(50), nullable=False)
+    forecast_periods = Column(Integer, nullable=False)
+    forecast = Column(Text, nullable=False)
+    mae = Column(Float)
+    mape = Column(Float)
+    rmse = Column(Float)
+    r2 = Column(Float)
+    seasonality = Column(Text)
+    fit_seconds = Column(Float)
+    generated_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,268 @@
+import logging
+import re
+import sys
+from datetime import date, datetime
+from sqlalchemy import text
+from .db_connection import get_engine
+from .migrations import MIGRATIONS, apply_migrations
+
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by month on transaction_date, parents first
+PARTITIONED_TABLES = ['transactions', 'transaction_items']
+
+ARCHIVE_SCHEMA = 'archive'
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+def _add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table, month):
+    """Name of the monthly partition of a table, e.g. transactions_2024_01"""
+    return f"{table}_{month:%Y_%m}"
+
+def is_partitioned(conn, table='transactions'):
+    """Check whether a table is a declaratively partitioned table"""
+    return bool(conn.execute(text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_class
+            WHERE oid = to_regclass(:table) AND relkind = 'p'
+        )
+    """), {'table': table}).scalar())
+
+def list_month_partitions(conn, table):
+    """Get the monthly partitions of a table as {month start: partition name}"""
+    names = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {'table': table}).scalars().all()
+    partitions = {}
+    for name in names:
+        match = re.fullmatch(rf"{table}_(\d{{4}})_(\d{{2}})", name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def _take_default_rows(conn, month, upper):
+    """
+    Move a month's rows out of the default partitions into temporary
+    tables, returning the tables and their row counts
+
+    A month partition cannot be created while the default partition holds
+    rows of that month. Writes to the default partitions are blocked until
+    the transaction ends, so no row is lost between the copy and the delete.
+    """
+    taken = {}
+    # Line items first, since they reference their transactions
+    for table in reversed(PARTITIONED_TABLES):
+        default = f"{table}_default"
+        if conn.execute(text("SELECT to_regclass(:name)"), {'name': default}).scalar() is None:
+            continue
+        conn.execute(text(f"LOCK TABLE {default} IN EXCLUSIVE MODE"))
+        params = {'start': month, 'end': upper}
+        count = conn.execute(text(f"""
+            SELECT COUNT(*) FROM {default}
+            WHERE transaction_date >= :start AND transaction_date < :end
+        """), params).scalar()
+        if not count:
+            continue
+        staging = f"{table}_moving"
+        conn.execute(text(f"""
+            CREATE TEMP TABLE {staging} ON COMMIT DROP AS
+            SELECT * FROM {default}
+            WHERE transaction_date >= :start AND transaction_date < :end
+        """), params)
+        conn.execute(text(f"""
+            DELETE FROM {default}
+            WHERE transaction_date >= :start AND transaction_date < :end
+        """), params)
+        taken[table] = (staging, count)
+    return taken
+
+def _create_month_partitions(conn, start_month, end_month):
+    """
+    Create the missing monthly partitions of every table from start to end
+    month, moving rows the default partitions already hold for a month
+    into its new partitions
+    """
+    created = 0
+    month = start_month
+    while month <= end_month:
+        upper = _add_months(month, 1)
+        missing = [
+            table for table in PARTITIONED_TABLES
+            if conn.execute(
+                text("SELECT to_regclass(:name)"), {'name': partition_name(table, month)}
+            ).scalar() is None
+        ]
+        if missing:
+            taken = _take_default_rows(conn, month, upper)
+            for table in missing:
+                conn.execute(text(f"""
+                    CREATE TABLE {partition_name(table, month)}
+                    PARTITION OF {table}
+                    FOR VALUES FROM ('{month}') TO ('{upper}')
+                """))
+            for table in PARTITIONED_TABLES:
+                if table in taken:
+                    staging, count = taken[table]
+                    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {staging}"))
+                    conn.execute(text(f"DROP TABLE pg_temp.{staging}"))
+                    logger.info(f"Moved {count} rows of {month:%Y-%m} from {table}_default")
+            created += 1
+        month = upper
+    return created
+
+def partition_transactions(bind=None, months_ahead=3):
+    """
+    Convert transactions and transaction_items into tables partitioned by
+    month on transaction_date
+
+    The existing rows are copied into monthly partitions spanning the data
+    plus ``months_ahead`` future months; a default partition catches
+    anything outside them. Runs in one transaction and does nothing if the
+    tables are already partitioned. Returns True when a conversion ran.
+
+    Partitioned line items are routed by transaction_date before any
+    trigger runs, so inserts have to supply it; the ORM copies it from
+    the parent transaction.
+    """
+    # transaction_items.transaction_date has to exist and be filled in
+    apply_migrations(bind)
+    with (bind or get_engine()).begin() as conn:
+        if is_partitioned(conn):
+            logger.info("Transactions are already partitioned")
+            return False
+
+        logger.info("Partitioning transactions and transaction_items by month...")
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+
+        conn.execute(text("""
+            CREATE TABLE transactions (
+                LIKE transactions_unpartitioned INCLUDING DEFAULTS,
+                PRIMARY KEY (transaction_id, transaction_date),
+                FOREIGN KEY (store_id) REFERENCES stores (store_id),
+                FOREIGN KEY (customer_id) REFERENCES customers (customer_id),
+                FOREIGN KEY (staff_id) REFERENCES staff (staff_id)
+            ) PARTITION BY RANGE (transaction_date)
+        """))
+        conn.execute(text("""
+            CREATE TABLE transaction_items (
+                LIKE transaction_items_unpartitioned INCLUDING DEFAULTS,
+                PRIMARY KEY (transaction_item_id, transaction_date),
+                FOREIGN KEY (transaction_id, transaction_date)
+                    REFERENCES transactions (transaction_id, transaction_date),
+                FOREIGN KEY (product_id) REFERENCES products (product_id)
+            ) PARTITION BY RANGE (transaction_date)
+        """))
+
+        first = conn.execute(
+            text("SELECT MIN(transaction_date) FROM transactions_unpartitioned")
+        ).scalar()
+        this_month = _month_start(datetime.now())
+        _create_month_partitions(
+            conn, _month_start(first) if first else this_month,
+            _add_months(this_month, months_ahead)
+        )
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+        conn.execute(text("INSERT INTO transactions SELECT * FROM transactions_unpartitioned"))
+        conn.execute(text("INSERT INTO transaction_items SELECT * FROM transaction_items_unpartitioned"))
+
+        # Keep the id sequences when the old tables are dropped
+        for table, column in [('transactions', 'transaction_id'),
+                              ('transaction_items', 'transaction_item_id')]:
+            sequence = conn.execute(
+                text("SELECT pg_get_serial_sequence(:table, :column)"),
+                {'table': f"{table}_unpartitioned", 'column': column}
+            ).scalar()
+            if sequence:
+                conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column}"))
+
+        for table in reversed(PARTITIONED_TABLES):
+            conn.execute(text(f"DROP TABLE {table}_unpartitioned"))
+
+        # Recreate the indexes on the partitioned parents
+        for version, name, steps in MIGRATIONS:
+            for step in steps:
+                if isinstance(step, str) and step.lstrip().startswith('CREATE') \
+                        and re.search(r"ON transaction(s|_items) ", step):
+                    conn.execute(text(step))
+        for table in PARTITIONED_TABLES:
+            conn.execute(text(f"ANALYZE {table}"))
+
+    logger.info("Transactions partitioned successfully")
+    return True
+
+def ensure_future_partitions(bind=None, months_ahead=3):
+    """
+    Create the monthly partitions up to ``months_ahead`` months from now
+
+    Meant for a scheduled maintenance run (``python -m
+    src.database.partitioning maintain``); rows of a new month already in
+    the default partition are moved into it. Does nothing when the tables
+    are not partitioned. Returns the number of months created.
+    """
+    with (bind or get_engine()).begin() as conn:
+        if not is_partitioned(conn):
+            return 0
+        this_month = _month_start(datetime.now())
+        return _create_month_partitions(conn, this_month, _add_months(this_month, months_ahead))
+
+def archive_partitions(before, bind=None, schema=ARCHIVE_SCHEMA):
+    """
+    Detach the monthly partitions that end on or before ``before`` and move
+    them into the archive schema
+
+    Archived rows no longer appear in queries on the parent tables, but stay
+    in the database as plain tables. The daily sales rollup keeps their
+    aggregates. Returns the archived partition names.
+    """
+    cutoff = _month_start(before)
+    archived = []
+    with (bind or get_engine()).begin() as conn:
+        if not is_partitioned(conn):
+            raise ValueError("Transactions are not partitioned")
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema}"))
+        # Line items first, since they reference their transactions
+        for table in reversed(PARTITIONED_TABLES):
+            for month, name in sorted(list_month_partitions(conn, table).items()):
+                if _add_months(month, 1) > cutoff:
+                    continue
+                conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                # A detached partition keeps its foreign keys to the parent
+                # tables, which would block detaching the referenced rows
+                foreign_keys = conn.execute(text("""
+                    SELECT conname FROM pg_constraint
+                    WHERE conrelid = to_regclass(:name)
+                        AND contype = 'f'
+                        AND confrelid = to_regclass('transactions')
+                """), {'name': name}).scalars().all()
+                for constraint in foreign_keys:
+                    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {constraint}"))
+                conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {schema}"))
+                archived.append(f"{schema}.{name}")
+    logger.info(f"Archived {len(archived)} partitions")
+    return archived
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'maintain'
+    if command == 'convert':
+        partition_transactions()
+    elif command == 'maintain':
+        print(f"Created partitions for {ensure_future_partitions()} months")
+    elif command == 'archive' and len(sys.argv) > 2:
+        before = datetime.strptime(sys.argv[2], '%Y-%m-%d').date()
+        for name in archive_partitions(before):
+            print(f"Archived {name}")
+    else:
+        print("Usage: python -m src.database.partitioning [convert | maintain | archive YYYY-MM-DD]")
+        sys.exit(1)
@@ -0,0 +1,105 @@
+import logging
+from datetime import timedelta
+import pandas as pd
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+from .models import RollupState
+
+logger = logging.getLogger(__name__)
+
+DAILY_SALES_ROLLUP = 'daily_product_store_sales'
+
+# Days before today re-aggregated on every incremental refresh
+ROLLUP_LOOKBACK_DAYS = 3
+
+def refresh_daily_sales(db: Session, full=False, lookback_days=ROLLUP_LOOKBACK_DAYS):
+    """
+    Bring the daily_product_store_sales rollup up to date
+
+    Only the days touched by transaction items added since the last refresh
+    are deleted and re-aggregated, so the cost is proportional to the new
+    data rather than the whole history. Item ids are handed out before
+    their transaction commits, so an item committed after a refresh can
+    sit below its watermark; today and the ``lookback_days`` days before
+    are therefore re-aggregated on every refresh as well. ``full``
+    rebuilds every day. Returns the number of days recomputed.
+    """
+    try:
+        # Create the watermark row if needed, then lock it so concurrent
+        # refreshes run one at a time
+        db.execute(text("""
+            INSERT INTO rollup_state (name, last_transaction_item_id)
+            VALUES (:name, 0)
+            ON CONFLICT (name) DO NOTHING
+        """), {'name': DAILY_SALES_ROLLUP})
+        state = db.query(RollupState).filter(
+            RollupState.name == DAILY_SALES_ROLLUP
+        ).with_for_update().one()
+
+        since_id = 0 if full else state.last_transaction_item_id
+        until_id = db.execute(
+            text("SELECT COALESCE(MAX(transaction_item_id), 0) FROM transaction_items")
+        ).scalar()
+
+        touched = []
+        if until_id > since_id:
+            touched = db.execute(text("""
+                SELECT DISTINCT DATE(t.transaction_date) as date
+                FROM transaction_items ti
+                JOIN transactions t ON ti.transaction_id = t.transaction_id
+                WHERE ti.transaction_item_id > :since_id
+                    AND ti.transaction_item_id <= :until_id
+            """), {'since_id': since_id, 'until_id': until_id}).scalars().all()
+        days = set(pd.to_datetime(touched).date)
+        if not full:
+            today = db.execute(text("SELECT CURRENT_DATE")).scalar()
+            days |= {today - timedelta(days=offset) for offset in range(lookback_days + 1)}
+        days = sorted(days)
+
+        if full:
+            db.execute(text("DELETE FROM daily_product_store_sales"))
+
+        # Re-aggregate the touched days in batches, bounding each scan by a
+        # transaction_date range so the date indexes and, on partitioned
+        # tables, partition pruning can be used
+        for offset in range(0, len(days), 366):
+            batch = days[offset:offset + 366]
+            params = {
+                'days': batch,
+                'start': batch[0],
+                'end': batch[-1] + timedelta(days=1)
+            }
+            if not full:
+                db.execute(text("""
+                    DELETE FROM daily_product_store_sales
+                    WHERE date IN :days
+                """).bindparams(bindparam('days', expanding=True)), params)
+            db.execute(text("""
+                INSERT INTO daily_product_store_sales
+                    (date, store_id, product_id, units, revenue, transactions)
+                SELECT
+                    DATE(t.transaction_date) as date,
+                    t.store_id,
+                    ti.product_id,
+                    SUM(ti.quantity) as units,
+                    SUM(ti.quantity * ti.unit_price) as revenue,
+                    COUNT(DISTINCT t.transaction_id) as transactions
+                FROM transactions t
+                JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
+                WHERE t.transaction_date >= :start
+                    AND t.transaction_date < :end
+                    AND ti.transaction_date >= :start
+                    AND ti.transaction_date < :end
+                    AND DATE(t.transaction_date) IN :days
+                    AND t.store_id IS NOT NULL
+                GROUP BY DATE(t.transaction_date), t.store_id, ti.product_id
+            """).bindparams(bindparam('days', expanding=True)), params)
+
+        state.last_transaction_item_id = until_id
+        db.commit()
+        logger.info(f"Refreshed daily sales rollup for {len(days)} days")
+        return len(days)
+    except Exception as e:
+        logger.error(f"Error refreshing daily sales rollup: {str(e)}")
+        db.rollback()
+        raise
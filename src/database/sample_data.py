@@ -360,7 +360,8 @@ def generate_transactions(db: Session, customers, stores, staff, products, num_t
                     product_id=product.product_id,
                     quantity=quantity,
                     unit_price=unit_price,
-                    total_price=total_price
+                    total_price=total_price,
+                    transaction_date=transaction.transaction_date
                 )
                 db.add(item)
                 total_amount += total_price
@@ -387,7 +388,8 @@ def generate_transactions(db: Session, customers, stores, staff, products, num_t
                         product_id=product.product_id,
                         quantity=quantity,
                         unit_price=unit_price,
-                        total_price=total_price
+                        total_price=total_price,
+                        transaction_date=transaction.transaction_date
                     )
                     db.add(item)
                     total_amount += total_price
@@ -100,10 +100,27 @@ CREATE TABLE transaction_items
     quantity INTEGER NOT NULL,
     unit_price DECIMAL(10,2) NOT NULL,
     total_price DECIMAL(10,2) NOT NULL,
+    transaction_date TIMESTAMP NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Line items inserted without a date take their transaction's
+CREATE FUNCTION set_transaction_item_date() RETURNS trigger AS $$
+BEGIN
+    IF NEW.transaction_date IS NULL THEN
+        SELECT transaction_date INTO NEW.transaction_date
+        FROM transactions
+        WHERE transaction_id = NEW.transaction_id;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_transaction_items_date
+BEFORE INSERT ON transaction_items
+FOR EACH ROW EXECUTE FUNCTION set_transaction_item_date();
+
 -- Promotions table
 CREATE TABLE promotions
 (
@@ -150,9 +167,86 @@ CREATE TABLE product_metrics
     PRIMARY KEY (product_id)
 );
 
+-- Daily sales rollup table, maintained by src/database/rollups.py
+CREATE TABLE daily_product_store_sales
+(
+    date DATE NOT NULL,
+    store_id INTEGER REFERENCES stores(store_id),
+    product_id INTEGER REFERENCES products(product_id),
+    units INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    transactions INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (date, store_id, product_id)
+);
+
+-- Rollup refresh watermarks
+CREATE TABLE rollup_state
+(
+    name VARCHAR(100) PRIMARY KEY,
+    last_transaction_item_id INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Batch demand forecasts per product and day, with the time taken to fit each product
+CREATE TABLE forecasts
+(
+    product_id INTEGER REFERENCES products(product_id),
+    date DATE NOT NULL,
+    yhat DOUBLE PRECISION NOT NULL,
+    yhat_lower DOUBLE PRECISION,
+    yhat_upper DOUBLE PRECISION,
+    trend DOUBLE PRECISION,
+    fit_seconds DOUBLE PRECISION,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, date)
+);
+
+-- Cached single-product forecasts, evicted least recently used first
+CREATE TABLE forecast_cache
+(
+    cache_key VARCHAR(64) PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(product_id),
+    forecast_periods INTEGER NOT NULL,
+    watermark VARCHAR(200) NOT NULL,
+    result TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Latest fitted Prophet parameters per product, used to warm-start refits
+CREATE TABLE forecast_models
+(
+    product_id INTEGER PRIMARY KEY REFERENCES products(product_id),
+    params TEXT NOT NULL,
+    fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Precomputed forecast, accuracy and seasonality per product for the dashboard
+CREATE TABLE product_forecasts
+(
+    product_id INTEGER PRIMARY KEY REFERENCES products(product_id),
+    engine VARCHAR(50) NOT NULL,
+    forecast_periods INTEGER NOT NULL,
+    forecast TEXT NOT NULL,
+    mae DOUBLE PRECISION,
+    mape DOUBLE PRECISION,
+    rmse DOUBLE PRECISION,
+    r2 DOUBLE PRECISION,
+    seasonality TEXT,
+    fit_seconds DOUBLE PRECISION,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes for better query performance
-CREATE INDEX idx_transactions_date ON transactions(transaction_date);
-CREATE INDEX idx_transactions_customer ON transactions(customer_id);
-CREATE INDEX idx_inventory_store_product ON inventory(store_id, product_id);
+-- (kept in sync with src/database/migrations.py)
+CREATE INDEX idx_transactions_date_covering ON transactions(transaction_date) INCLUDE (transaction_id, store_id, customer_id);
+CREATE INDEX idx_transactions_customer_date ON transactions(customer_id, transaction_date) INCLUDE (total_amount);
+CREATE UNIQUE INDEX uq_inventory_store_product ON inventory(store_id, product_id);
 CREATE INDEX idx_products_category ON products(category);
-CREATE INDEX idx_transaction_items_transaction ON transaction_items(transaction_id); 
\ No newline at end of file
+CREATE INDEX idx_transaction_items_transaction_covering ON transaction_items(transaction_id) INCLUDE (product_id, quantity, unit_price);
+CREATE INDEX idx_transaction_items_product ON transaction_items(product_id, transaction_id) INCLUDE (quantity);
+CREATE INDEX idx_daily_sales_product_date ON daily_product_store_sales(product_id, date) INCLUDE (store_id, units);
+CREATE INDEX idx_transaction_items_date ON transaction_items(transaction_date);
+CREATE INDEX ix_forecast_cache_product_id ON forecast_cache(product_id);
+CREATE INDEX idx_forecast_cache_last_used ON forecast_cache(last_used_at);
@@ -8,9 +8,10 @@ sys.path.append(project_root)
 import pytest
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from src.database.db_connection import get_db, init_db, engine, Base
+from src.database.db_connection import get_db, init_db, get_engine, Base
 from src.database.sample_data import generate_sample_data
 from src.database.data_pipeline import DataPipeline
+from src.database.rollups import refresh_daily_sales
 from src.analysis.customer_segmentation import get_customer_segmentation_insights
 from src.analysis.demand_forecasting import get_demand_forecast
 from src.analysis.inventory_optimization import get_inventory_optimization_insights
@@ -29,8 +30,8 @@ def setup_database():
     db = None
     try:
         # Drop all tables and recreate schema
-        Base.metadata.drop_all(engine)
-        Base.metadata.create_all(engine)
+        Base.metadata.drop_all(get_engine())
+        Base.metadata.create_all(get_engine())
         print("Database tables created successfully")
 
         # Get database session
@@ -39,6 +40,7 @@ def setup_database():
         print("Starting sample data generation...")
         result = generate_sample_data(db)
         db.commit()
+        refresh_daily_sales(db, full=True)
         print("Sample data generated successfully")
         print(f"Generated sample data:")
         print(f"- {result['stores']} stores")
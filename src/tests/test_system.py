@@ -1,17 +1,43 @@
+import os
+import subprocess
+import sys
+import time
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pandas as pd
 import numpy as np
 from sqlalchemy.orm import Session
-from src.database.db_connection import get_db, init_db
+from src.database.db_connection import get_db, get_db_url, init_db
 from src.database.sample_data import generate_sample_data
 from src.database.data_pipeline import DataPipeline
+from src.database.rollups import (
+    refresh_daily_sales, DAILY_SALES_ROLLUP, ROLLUP_LOOKBACK_DAYS
+)
+from src.database.migrations import apply_migrations, verify_index_usage
+from src.database.partitioning import (
+    partition_transactions, ensure_future_partitions, archive_partitions, is_partitioned,
+    list_month_partitions, partition_name
+)
 from src.analysis.customer_segmentation import get_customer_segmentation_insights
-from src.analysis.demand_forecasting import get_demand_forecast
-from src.analysis.inventory_optimization import get_inventory_optimization_insights
+from src.analysis.demand_forecasting import (
+    get_demand_forecast, batch_forecast, NumpyForecastEngine, GlobalRegressionForecastEngine,
+    FORECAST_ENGINES, SalesMatrix, prepare_time_series_data
+)
+from src.analysis.forecast_cache import (
+    clear_forecast_cache, serialize_forecast, deserialize_forecast
+)
+from src.analysis.forecast_store import precompute_forecasts, load_product_forecast
+from src.analysis.backtesting import run_backtest
+from src.analysis.hierarchical_forecasting import Hierarchy, hierarchical_forecast, series_forecast
+from src.analysis.model_store import load_model_params
+from src.analysis.inventory_optimization import (
+    get_inventory_optimization_insights, generate_inventory_recommendations,
+    optimize_inventory_levels, get_demand_summary, calculate_demand_statistics
+)
+from src.analysis.inventory_simulation import simulate_inventory_policy
 from src.analysis.product_recommendations import get_comprehensive_recommendations
 from src.database.init_db import Base
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 def test_database_initialization():
     """Test database initialization and sample data generation"""
@@ -28,6 +54,7 @@ def test_database_initialization():
         # Generate sample data
         result = generate_sample_data(db)
         db.commit()
+        refresh_daily_sales(db, full=True)
 
         # Verify data was generated
         assert result['stores'] > 0, "No stores were generated"
@@ -48,6 +75,27 @@ def test_database_initialization():
         if db:
             db.close()
 
+def test_lazy_db_connection_import():
+    """Test that importing the database modules does not create an engine"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = (
+        "import src.database.db_connection as db_connection, src.database.models; "
+        "assert db_connection._engine is None"
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=project_root, check=True)
+
+def test_lazy_analysis_imports():
+    """Test that importing the analysis modules does not load the ML libraries"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    code = (
+        "import sys, src.analysis.customer_segmentation, src.analysis.demand_forecasting, "
+        "src.analysis.inventory_optimization, src.analysis.product_recommendations; "
+        "loaded = [m for m in ('prophet', 'sklearn', 'mlxtend', 'scipy', 'src.database.data_pipeline') "
+        "if m in sys.modules]; "
+        "assert not loaded, loaded"
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=project_root, check=True)
+
 def test_data_pipeline():
     """Test the ETL pipeline"""
     print("\nTesting data pipeline...")
@@ -87,6 +135,358 @@ def test_data_pipeline():
         print("Closing database connection...")
         db.close()
 
+def test_incremental_data_pipeline():
+    """Test that an incremental reload merges into the previous result"""
+    db = next(get_db())
+    try:
+        pipeline = DataPipeline(db)
+        full = pipeline.run_pipeline()
+        assert 'watermarks' in full, "Missing watermarks in result"
+        
+        # Nothing changed in between, so the merged frames match the full load
+        incremental = pipeline.run_pipeline(previous=full)
+        for key in ['transaction_data', 'inventory_data', 'product_data', 'customer_data']:
+            assert len(incremental[key]) == len(full[key]), f"{key} changed size on incremental reload"
+        assert incremental['watermarks'] == full['watermarks'], "Watermarks moved without new data"
+    finally:
+        db.close()
+
+def test_concurrent_data_pipeline():
+    """Test that concurrent extraction returns the same data with timings"""
+    db = next(get_db())
+    try:
+        pipeline = DataPipeline(db)
+        serial = pipeline.run_pipeline()
+        concurrent = pipeline.run_pipeline(concurrent=True)
+        
+        for key in ['transaction_data', 'inventory_data', 'product_data', 'customer_data']:
+            assert len(concurrent[key]) == len(serial[key]), f"{key} differs between modes"
+            assert concurrent['timings'][key] >= 0, f"Missing timing for {key}"
+    finally:
+        db.close()
+
+def test_pipeline_compact_dtypes():
+    """Test that pipeline frames use the compact dataset schema"""
+    db = next(get_db())
+    try:
+        result = DataPipeline(db).run_pipeline()
+        
+        assert isinstance(result['inventory_data']['category'].dtype, pd.CategoricalDtype), \
+            "Inventory category is not categorical"
+        assert result['inventory_data']['quantity'].dtype == np.int32, "Inventory quantity is not int32"
+        assert result['transaction_data']['unit_price'].dtype == np.float32, "Unit price is not float32"
+        assert isinstance(result['transaction_data']['payment_method'].dtype, pd.CategoricalDtype), \
+            "Payment method is not categorical"
+        assert result['memory']['transaction_data']['saved'] > 0, "Compact dtypes saved no memory"
+    finally:
+        db.close()
+
+def test_stream_transaction_data():
+    """Test that streamed transaction chunks are bounded and cover the extract"""
+    db = next(get_db())
+    try:
+        pipeline = DataPipeline(db)
+        chunks = list(pipeline.stream_transaction_data(chunk_size=1000))
+        
+        assert all(len(chunk) <= 1000 for chunk in chunks), "Chunk exceeds chunk_size"
+        full = pipeline._get_transaction_data()
+        assert sum(len(chunk) for chunk in chunks) == len(full), \
+            "Streamed rows do not match the full extract"
+        assert full.attrs['raw_bytes'] >= full.memory_usage(deep=True).sum()
+    finally:
+        db.close()
+
+def test_load_aggregated_data():
+    """Test the bulk loader inserts and then upserts aggregated rows"""
+    db = next(get_db())
+    try:
+        db.execute(text("DROP TABLE IF EXISTS test_aggregates"))
+        db.execute(text("""
+            CREATE TABLE test_aggregates (
+                product_id INTEGER PRIMARY KEY,
+                total_quantity FLOAT
+            )
+        """))
+        db.commit()
+        
+        pipeline = DataPipeline(db)
+        data = pd.DataFrame({'product_id': range(1, 101), 'total_quantity': 1.0})
+        stats = pipeline.load_aggregated_data(data, 'test_aggregates')
+        assert stats['rows'] == 100, "Not all rows were loaded"
+        assert stats['rows_per_second'] > 0, "Throughput was not reported"
+        
+        data['total_quantity'] = 2.0
+        pipeline.load_aggregated_data(data, 'test_aggregates', key_columns=['product_id'])
+        total = db.execute(text("SELECT COUNT(*), SUM(total_quantity) FROM test_aggregates")).one()
+        assert tuple(total) == (100, 200.0), "Upsert did not update existing rows"
+    finally:
+        db.execute(text("DROP TABLE IF EXISTS test_aggregates"))
+        db.commit()
+        db.close()
+
+def test_daily_sales_rollup():
+    """Test that the daily sales rollup matches the raw line items"""
+    db = next(get_db())
+    try:
+        # Nothing new since the last refresh, so only the trailing days are recomputed
+        assert refresh_daily_sales(db) == ROLLUP_LOOKBACK_DAYS + 1, \
+            "Up-to-date rollup recomputed more than the trailing days"
+        
+        rollup = db.execute(text(
+            "SELECT SUM(units), SUM(transactions) FROM daily_product_store_sales"
+        )).one()
+        raw = db.execute(text("""
+            SELECT SUM(ti.quantity), COUNT(DISTINCT (DATE(t.transaction_date), t.store_id, ti.product_id, t.transaction_id))
+            FROM transactions t
+            JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
+        """)).one()
+        assert rollup[0] == raw[0], "Rollup units do not match line items"
+        assert rollup[1] == raw[1], "Rollup transaction counts do not match"
+    finally:
+        db.close()
+
+def test_daily_sales_rollup_late_commit():
+    """Test that an item committed below the refresh watermark is still rolled up"""
+    db = next(get_db())
+    transaction_id = None
+    try:
+        store_id = db.execute(text("SELECT MIN(store_id) FROM stores")).scalar()
+        product_id = db.execute(text("SELECT MIN(product_id) FROM products")).scalar()
+        transaction_id = db.execute(text("""
+            INSERT INTO transactions (store_id, transaction_date, total_amount)
+            VALUES (:store_id, NOW(), 0)
+            RETURNING transaction_id
+        """), {'store_id': store_id}).scalar()
+        item_id = db.execute(text("""
+            INSERT INTO transaction_items (transaction_id, product_id, quantity, unit_price, total_price)
+            VALUES (:transaction_id, :product_id, 5, 0, 0)
+            RETURNING transaction_item_id
+        """), {'transaction_id': transaction_id, 'product_id': product_id}).scalar()
+        # As if a refresh had read a later id before this item committed
+        db.execute(text("""
+            UPDATE rollup_state SET last_transaction_item_id = :item_id
+            WHERE name = :name
+        """), {'item_id': item_id + 1, 'name': DAILY_SALES_ROLLUP})
+        db.commit()
+        
+        refresh_daily_sales(db)
+        params = {'store_id': store_id, 'product_id': product_id}
+        rolled_up = db.execute(text("""
+            SELECT units FROM daily_product_store_sales
+            WHERE date = CURRENT_DATE AND store_id = :store_id AND product_id = :product_id
+        """), params).scalar()
+        raw = db.execute(text("""
+            SELECT SUM(ti.quantity)
+            FROM transactions t
+            JOIN transaction_items ti ON t.transaction_id = ti.transaction_id
+            WHERE DATE(t.transaction_date) = CURRENT_DATE
+                AND t.store_id = :store_id AND ti.product_id = :product_id
+        """), params).scalar()
+        assert rolled_up == raw, "Late-committed item is missing from the rollup"
+    finally:
+        db.rollback()
+        if transaction_id is not None:
+            db.execute(text("DELETE FROM transaction_items WHERE transaction_id = :id"),
+                       {'id': transaction_id})
+            db.execute(text("DELETE FROM transactions WHERE transaction_id = :id"),
+                       {'id': transaction_id})
+            db.execute(text("""
+                UPDATE rollup_state
+                SET last_transaction_item_id = (
+                    SELECT COALESCE(MAX(transaction_item_id), 0) FROM transaction_items
+                )
+                WHERE name = :name
+            """), {'name': DAILY_SALES_ROLLUP})
+            db.commit()
+            refresh_daily_sales(db)
+        db.close()
+
+PARTITION_TEST_SCHEMA = 'partition_test'
+
+def _create_partition_scratch():
+    """
+    Create the tables in a scratch schema with three months of
+    transactions, returning an engine whose search_path is that schema
+    """
+    admin = create_engine(get_db_url())
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {PARTITION_TEST_SCHEMA} CASCADE"))
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {PARTITION_TEST_SCHEMA}_archive CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {PARTITION_TEST_SCHEMA}"))
+    admin.dispose()
+    
+    engine = create_engine(
+        get_db_url(), connect_args={'options': f"-csearch_path={PARTITION_TEST_SCHEMA}"}
+    )
+    Base.metadata.create_all(engine)
+    apply_migrations(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO stores (store_id, name) VALUES (1, 'Test store')"))
+        conn.execute(text("""
+            INSERT INTO products (product_id, sku, name, unit_cost, unit_price)
+            VALUES (1, 'TEST-1', 'Test product', 1.0, 2.0)
+        """))
+        for month in [1, 2, 3]:
+            for day in [5, 20]:
+                transaction_id = conn.execute(text("""
+                    INSERT INTO transactions (store_id, transaction_date, total_amount)
+                    VALUES (1, :date, 4.0)
+                    RETURNING transaction_id
+                """), {'date': datetime(2024, month, day, 12)}).scalar()
+                for _ in range(2):
+                    conn.execute(text("""
+                        INSERT INTO transaction_items
+                            (transaction_id, product_id, quantity, unit_price, total_price)
+                        VALUES (:transaction_id, 1, 1, 2.0, 2.0)
+                    """), {'transaction_id': transaction_id})
+    return engine
+
+def _drop_partition_scratch(engine):
+    engine.dispose()
+    admin = create_engine(get_db_url())
+    with admin.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {PARTITION_TEST_SCHEMA} CASCADE"))
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {PARTITION_TEST_SCHEMA}_archive CASCADE"))
+    admin.dispose()
+
+def _row_ids(engine):
+    with engine.connect() as conn:
+        return (
+            conn.execute(text("SELECT transaction_id FROM transactions ORDER BY 1")).scalars().all(),
+            conn.execute(text("SELECT transaction_item_id FROM transaction_items ORDER BY 1")).scalars().all()
+        )
+
+def test_partition_transactions():
+    """Test that partitioning keeps every row and id and only runs once"""
+    engine = _create_partition_scratch()
+    try:
+        before = _row_ids(engine)
+        assert partition_transactions(engine)
+        with engine.connect() as conn:
+            assert is_partitioned(conn, 'transactions')
+            assert is_partitioned(conn, 'transaction_items')
+            months = list_month_partitions(conn, 'transaction_items')
+        assert date(2024, 1, 1) in months and date(2024, 3, 1) in months
+        assert _row_ids(engine) == before
+        
+        # The id sequences carry on after the conversion
+        with engine.begin() as conn:
+            transaction_id = conn.execute(text("""
+                INSERT INTO transactions (store_id, transaction_date, total_amount)
+                VALUES (1, '2024-02-10', 2.0)
+                RETURNING transaction_id
+            """)).scalar()
+        assert transaction_id > max(before[0])
+        
+        assert not partition_transactions(engine)
+    finally:
+        _drop_partition_scratch(engine)
+
+def test_ensure_future_partitions():
+    """Test that future partitions are created once and take default-partition rows"""
+    engine = _create_partition_scratch()
+    try:
+        partition_transactions(engine, months_ahead=3)
+        with engine.connect() as conn:
+            partitions = list_month_partitions(conn, 'transactions')
+        assert ensure_future_partitions(engine, months_ahead=3) == 0
+        with engine.connect() as conn:
+            assert list_month_partitions(conn, 'transactions') == partitions
+        
+        # A sale beyond the existing partitions lands in the default partition
+        month = date.today().replace(day=1)
+        for _ in range(6):
+            month = (month + timedelta(days=32)).replace(day=1)
+        with engine.begin() as conn:
+            transaction_id = conn.execute(text("""
+                INSERT INTO transactions (store_id, transaction_date, total_amount)
+                VALUES (1, :date, 2.0)
+                RETURNING transaction_id
+            """), {'date': month + timedelta(days=9)}).scalar()
+            conn.execute(text("""
+                INSERT INTO transaction_items
+                    (transaction_id, product_id, quantity, unit_price, total_price, transaction_date)
+                VALUES (:transaction_id, 1, 1, 2.0, 2.0, :date)
+            """), {'transaction_id': transaction_id, 'date': month + timedelta(days=9)})
+            assert conn.execute(text("SELECT COUNT(*) FROM transactions_default")).scalar() == 1
+        before = _row_ids(engine)
+        
+        assert ensure_future_partitions(engine, months_ahead=6) == 3
+        assert ensure_future_partitions(engine, months_ahead=6) == 0
+        with engine.connect() as conn:
+            for table in ['transactions', 'transaction_items']:
+                assert conn.execute(text(f"SELECT COUNT(*) FROM {table}_default")).scalar() == 0
+                assert conn.execute(
+                    text(f"SELECT COUNT(*) FROM {partition_name(table, month)}")
+                ).scalar() == 1
+        assert _row_ids(engine) == before
+    finally:
+        _drop_partition_scratch(engine)
+
+def test_archive_partitions():
+    """Test that old months move to the archive schema with the foreign keys intact"""
+    engine = _create_partition_scratch()
+    archive = f"{PARTITION_TEST_SCHEMA}_archive"
+    try:
+        partition_transactions(engine)
+        archived = archive_partitions(date(2024, 2, 1), engine, schema=archive)
+        assert sorted(archived) == [
+            f"{archive}.transaction_items_2024_01", f"{archive}.transactions_2024_01"
+        ]
+        with engine.connect() as conn:
+            assert date(2024, 1, 1) not in list_month_partitions(conn, 'transactions')
+            assert conn.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"),
+                {'name': f"{archive}.transactions_2024_01"}
+            ).scalar()
+            # Archived rows leave the parent tables
+            assert conn.execute(text(
+                "SELECT COUNT(*) FROM transactions WHERE transaction_date < '2024-02-01'"
+            )).scalar() == 0
+            assert conn.execute(text("SELECT COUNT(*) FROM transactions")).scalar() == 4
+            assert conn.execute(text("SELECT COUNT(*) FROM transaction_items")).scalar() == 8
+            assert conn.execute(
+                text(f"SELECT COUNT(*) FROM {archive}.transaction_items_2024_01")
+            ).scalar() == 4
+        
+        # Line items still have to reference an existing transaction
+        with pytest.raises(Exception):
+            with engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO transaction_items
+                        (transaction_id, product_id, quantity, unit_price, total_price, transaction_date)
+                    VALUES (-1, 1, 1, 2.0, 2.0, '2024-02-10')
+                """))
+    finally:
+        _drop_partition_scratch(engine)
+
+def test_index_usage():
+    """Test that the hot query paths are served by their indexes"""
+    apply_migrations()
+    for name, result in verify_index_usage().items():
+        assert result['uses_index'], \
+            f"{name} does not use {result['expected_index']}: {result['indexes_used']}, " \
+            f"missing INCLUDE {result['missing_columns']}"
+
+def test_transaction_item_date_filled():
+    """Test that line items inserted without a date take their transaction's"""
+    apply_migrations()
+    db = next(get_db())
+    try:
+        transaction_id, transaction_date = db.execute(
+            text("SELECT transaction_id, transaction_date FROM transactions LIMIT 1")
+        ).one()
+        product_id = db.execute(text("SELECT product_id FROM products LIMIT 1")).scalar()
+        item_date = db.execute(text("""
+            INSERT INTO transaction_items (transaction_id, product_id, quantity, unit_price, total_price)
+            VALUES (:transaction_id, :product_id, 1, 1.0, 1.0)
+            RETURNING transaction_date
+        """), {'transaction_id': transaction_id, 'product_id': product_id}).scalar()
+        assert item_date == transaction_date
+    finally:
+        db.rollback()
+        db.close()
+
 def test_customer_segmentation():
     """Test customer segmentation analysis"""
     db = next(get_db())
@@ -128,6 +528,276 @@ def test_demand_forecasting():
         # Check accuracy metrics
         assert all(metric in result['accuracy'] for metric in ['mae', 'mape', 'rmse'])
         
+        # Check seasonal patterns
+        assert set(result['seasonality']) == {'yearly', 'weekly', 'monthly'}
+        if result['seasonality']['weekly']:
+            assert len(result['seasonality']['weekly']) == 7
+            assert set(result['seasonality']['weekly'][0]) == {'day', 'weekly'}
+        
+    finally:
+        db.close()
+
+def test_sales_matrix():
+    """Test the dense product x day sales matrix and its views"""
+    matrix = SalesMatrix.from_records(
+        dates=['2024-01-01', '2024-01-03', '2024-01-03', '2024-02-01'],
+        product_ids=[7, 7, 3, 3],
+        quantities=[2, 5, 1, 9],
+        start='2024-01-01',
+        end='2024-01-05'
+    )
+    assert matrix.shape == (2, 5)
+    assert list(matrix.product_ids) == [3, 7]
+    assert list(matrix.row(7)) == [2, 0, 5, 0, 0]
+    # Rows outside the date range are dropped
+    assert matrix.values.sum() == 8
+    
+    long = matrix.to_long()
+    assert list(long.columns) == ['ds', 'y', 'product_id']
+    assert len(long) == 10
+    nonzero = matrix.to_long(nonzero_only=True)
+    assert len(nonzero) == 3
+    assert nonzero['y'].sum() == 8
+    
+    wide = matrix.to_frame()
+    assert wide.loc['2024-01-03', 3] == 1
+    
+    # Requested products keep their order and get zero rows without sales
+    matrix = SalesMatrix.from_records(
+        ['2024-01-02'], [3], [4], '2024-01-01', '2024-01-02', products=[5, 3]
+    )
+    assert matrix.values.tolist() == [[0, 0], [0, 4]]
+
+def test_run_backtest():
+    """Test the rolling-origin backtest across engines and product classes"""
+    days = np.arange(120)
+    rng = np.random.default_rng(1)
+    values = 10 + 3 * np.sin(2 * np.pi * days / 7) + rng.normal(0, 0.5, (20, 120))
+    matrix = SalesMatrix(values, np.arange(20), pd.date_range('2024-01-01', periods=120, freq='D'))
+    classes = {product_id: 'A' if product_id < 10 else 'B' for product_id in range(20)}
+    
+    result = run_backtest(
+        matrix, engines=['seasonal_naive', 'holt_winters'], horizon=7, n_cutoffs=3,
+        product_classes=classes, max_workers=2
+    )
+    
+    metrics = result['metrics']
+    assert len(metrics) == 2 * 20 * 3
+    assert set(metrics['product_class']) == {'A', 'B'}
+    assert all(metric in metrics.columns for metric in ['mae', 'mape', 'rmse', 'r2', 'fit_seconds'])
+    assert len(result['cutoffs']) == 3
+    assert set(result['summary'].index.get_level_values('engine')) == {'seasonal_naive', 'holt_winters'}
+    assert (result['timings']['wall_clock_seconds'] > 0).all()
+
+def test_hierarchical_forecast():
+    """Test that reconciled store/category/product forecasts add up"""
+    keys = pd.DataFrame({
+        'store_id': np.repeat([1, 2], 4),
+        'product_id': np.tile([10, 11, 12, 13], 2),
+        'category': np.tile(['A', 'A', 'B', 'B'], 2)
+    })
+    days = np.arange(90)
+    rng = np.random.default_rng(2)
+    values = 5 + 2 * np.sin(2 * np.pi * days / 7) + rng.normal(0, 0.5, (8, 90))
+    matrix = SalesMatrix(values, np.arange(8), pd.date_range('2024-01-01', periods=90, freq='D'))
+    hierarchy = Hierarchy(keys)
+    
+    for method in ['bottom_up', 'top_down', 'mint']:
+        result = hierarchical_forecast(
+            matrix, hierarchy, levels=['total', 'store', 'category', 'store_product'],
+            method=method, forecast_periods=7
+        )
+        forecast = result['forecast']
+        assert all(col in forecast.columns
+                   for col in ['level', 'ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend'])
+        daily = forecast.groupby(['level', 'ds'])['yhat'].sum().unstack('level')
+        for level in ['total', 'store', 'category']:
+            np.testing.assert_allclose(daily[level], daily['store_product'], rtol=1e-6)
+        
+        store = series_forecast(result, 'store', store_id=2)
+        assert len(store['forecast']) == 7
+        stores = forecast[forecast['level'] == 'store_product'].groupby(['store_id', 'ds'])['yhat'].sum()
+        np.testing.assert_allclose(store['forecast']['yhat'], stores.loc[2].to_numpy())
+
+def test_prepare_time_series_data():
+    """Test that the time series cover every product with sales"""
+    db = next(get_db())
+    try:
+        matrix = prepare_time_series_data(db, days_back=90)
+        assert matrix.shape[1] == 91
+        assert matrix.values.sum() > 0
+        long = matrix.to_long(product_id=matrix.product_ids[0])
+        assert len(long) == 91
+    finally:
+        db.close()
+
+def test_numpy_forecast_engine():
+    """Test the vectorized forecasting engines on synthetic weekly series"""
+    days = np.arange(120)
+    rng = np.random.default_rng(0)
+    values = 10 + 3 * np.sin(2 * np.pi * days / 7) + rng.normal(0, 0.5, (50, 120))
+    history = pd.DataFrame(
+        values.T, index=pd.date_range('2024-01-01', periods=120, freq='D'), columns=range(50)
+    )
+    
+    for method in NumpyForecastEngine.METHODS:
+        engine = NumpyForecastEngine(method=method)
+        predicted = engine.fit_predict(values, forecast_periods=14)
+        assert predicted['yhat'].shape == (50, 134)
+        assert not np.isnan(predicted['yhat']).any()
+        assert (predicted['yhat_lower'] <= predicted['yhat_upper']).all()
+        
+        results = engine.forecast(history, forecast_periods=14)
+        forecast = results[0]['forecast']
+        assert list(forecast.columns) == ['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend']
+        assert len(forecast) == 134
+        if method != 'exponential_smoothing':
+            # Weekly patterns are learned well enough to beat the series mean
+            assert results[0]['accuracy']['r2'] > 0.5
+
+def test_global_forecast_engine():
+    """Test the global regression engines across many synthetic series"""
+    days = np.arange(120)
+    rng = np.random.default_rng(3)
+    levels = rng.uniform(1, 20, (40, 1))
+    values = levels * (1 + 0.3 * np.sin(2 * np.pi * days / 7)) + rng.normal(0, 0.5, (40, 120))
+    history = pd.DataFrame(
+        values.T, index=pd.date_range('2024-01-01', periods=120, freq='D'), columns=range(40)
+    )
+    
+    for method in GlobalRegressionForecastEngine.METHODS:
+        engine = GlobalRegressionForecastEngine(method=method)
+        predicted = engine.predict(history, forecast_periods=14)
+        assert predicted.shape == (40, 14)
+        assert (predicted >= 0).all()
+        
+        results = engine.forecast(history, forecast_periods=14)
+        forecast = results[0]['forecast']
+        assert list(forecast.columns) == ['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend']
+        assert len(forecast) == 134
+        assert results[0]['accuracy']['r2'] > 0.5
+    
+    # Building features in small blocks of series gives the same forecasts
+    blocked = GlobalRegressionForecastEngine(block_rows=500, max_train_rows=2000)
+    unblocked = GlobalRegressionForecastEngine(max_train_rows=2000)
+    np.testing.assert_allclose(
+        blocked.predict(history, forecast_periods=14),
+        unblocked.predict(history, forecast_periods=14),
+        rtol=1e-5
+    )
+
+def test_engine_demand_forecast():
+    """Test single-product forecasts with every engine"""
+    db = next(get_db())
+    try:
+        for engine in FORECAST_ENGINES[1:]:
+            result = get_demand_forecast(db, product_id=1, engine=engine, use_cache=False)
+            assert 'error' not in result
+            assert all(col in result['forecast'].columns
+                       for col in ['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend'])
+            assert all(metric in result['accuracy'] for metric in ['mae', 'mape', 'rmse', 'r2'])
+    finally:
+        db.close()
+
+def test_forecast_cache():
+    """Test that repeated forecasts are served from the cache"""
+    db = next(get_db())
+    try:
+        clear_forecast_cache(db, product_id=1)
+        first = get_demand_forecast(db, product_id=1, forecast_periods=14)
+        if 'error' in first:
+            pytest.skip(first['error'])
+        
+        start = time.perf_counter()
+        second = get_demand_forecast(db, product_id=1, forecast_periods=14)
+        assert time.perf_counter() - start < 1
+        pd.testing.assert_frame_equal(first['forecast'], second['forecast'])
+        
+        cached = db.execute(
+            text("SELECT COUNT(*) FROM forecast_cache WHERE product_id = 1")
+        ).scalar()
+        assert cached == 1
+        assert clear_forecast_cache(db, product_id=1) == 1
+        
+    finally:
+        db.close()
+
+def test_forecast_cache_serialization():
+    """Test that cached forecasts round-trip through JSON"""
+    forecast = {
+        'forecast': pd.DataFrame({
+            'ds': pd.date_range('2024-01-01', periods=3, freq='D'),
+            'yhat': [1.5, 2.0, np.nan]
+        }),
+        'accuracy': {'mae': np.float64(0.5), 'mape': None},
+        'seasonality': {'weekly': [{'day': 'Monday', 'weekly': 0.1}]}
+    }
+    result = deserialize_forecast(serialize_forecast(forecast))
+    pd.testing.assert_frame_equal(result['forecast'], forecast['forecast'])
+    assert result['accuracy'] == {'mae': 0.5, 'mape': None}
+    assert result['seasonality'] == forecast['seasonality']
+
+def test_forecast_model_store():
+    """Test that Prophet fits store their parameters for warm starts"""
+    db = next(get_db())
+    try:
+        result = get_demand_forecast(db, product_id=1, forecast_periods=14, use_cache=False)
+        if 'error' in result:
+            pytest.skip(result['error'])
+        assert 'model_params' not in result
+        
+        params = load_model_params(db, [1])[1]
+        assert set(params) == {'k', 'm', 'sigma_obs', 'delta', 'beta'}
+        
+        # A warm-started refit gives the same kind of forecast
+        warm = get_demand_forecast(db, product_id=1, forecast_periods=14, use_cache=False)
+        assert len(warm['forecast']) == len(result['forecast'])
+    finally:
+        db.close()
+
+def test_batch_forecast():
+    """Test parallel batch forecasting into the forecasts table"""
+    db = next(get_db())
+    try:
+        result = batch_forecast(db, product_ids=[1, 2], forecast_periods=14, max_workers=2)
+        
+        assert set(result['forecasts']) | set(result['errors']) == {1, 2}
+        assert all(seconds >= 0 for seconds in result['fit_seconds'].values())
+        
+        stored = db.execute(text("""
+            SELECT product_id, COUNT(*), MIN(fit_seconds)
+            FROM forecasts
+            WHERE product_id IN (1, 2)
+            GROUP BY product_id
+        """)).all()
+        for product_id, rows, fit_seconds in stored:
+            assert rows == len(result['forecasts'][product_id]['forecast'])
+            assert fit_seconds is not None
+        assert {row[0] for row in stored} == set(result['forecasts'])
+        
+    finally:
+        db.close()
+
+def test_precompute_forecasts():
+    """Test that precomputed forecasts are stored and read back for the dashboard"""
+    db = next(get_db())
+    try:
+        result = precompute_forecasts(db, product_ids=[1, 2], engine='holt_winters', forecast_periods=28)
+        assert result['stored'] == len(result['forecasts'])
+        
+        for product_id in result['forecasts']:
+            stored = load_product_forecast(db, product_id)
+            assert stored['engine'] == 'holt_winters'
+            assert all(col in stored['forecast'].columns
+                       for col in ['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend'])
+            assert all(metric in stored['accuracy'] for metric in ['mae', 'mape', 'rmse', 'r2'])
+            assert stored['seasonality']['weekly'] is not None
+            
+            # Shorter horizons are cut from the stored forecast
+            shorter = load_product_forecast(db, product_id, forecast_periods=7)
+            assert len(shorter['forecast']) == len(stored['forecast']) - 21
+        
+        assert load_product_forecast(db, -1) is None
     finally:
         db.close()
 
@@ -150,6 +820,147 @@ def test_inventory_optimization():
     finally:
         db.close()
 
+def test_demand_summary():
+    """Test that the SQL demand summary matches zero-filled daily statistics"""
+    db = next(get_db())
+    try:
+        summary = get_demand_summary(db, days_back=90)
+        assert not summary.empty
+        assert not summary.duplicated(['store_id', 'product_id']).any()
+        n_days = int(summary['days'].iloc[0])
+        
+        daily = pd.read_sql(text("""
+            SELECT store_id, product_id, units as quantity
+            FROM daily_product_store_sales
+            WHERE date >= CURRENT_DATE - :days + 1 AND date <= CURRENT_DATE
+        """), db.bind, params={'days': n_days})
+        expected = calculate_demand_statistics(daily, n_days=n_days)
+        result = summary.set_index(['store_id', 'product_id']).loc[expected.index]
+        np.testing.assert_allclose(result['daily_demand'], expected['daily_demand'])
+        np.testing.assert_allclose(result['demand_std'], expected['demand_std'], atol=1e-9)
+        assert (result['sales_days'] <= n_days).all()
+    finally:
+        db.close()
+
+def test_optimize_inventory_levels_per_store():
+    """Test that demand, EOQ and reorder points are computed per store and product"""
+    inventory_data = pd.DataFrame({
+        'store_id': [2, 1, 1, 2],
+        'product_id': [10, 10, 11, 11],
+        'quantity': [5, 50, 7, 9],
+        'unit_cost': [4.0, 4.0, 2.0, 2.0],
+        'reorder_point': [10, 10, 10, 10]
+    })
+    sales_history = pd.DataFrame({
+        'store_id': [1, 1, 2, 2, 1],
+        'product_id': [10, 10, 10, 10, 11],
+        'quantity': [2, 2, 10, 10, 1]
+    })
+    
+    result = optimize_inventory_levels(inventory_data, sales_history, lead_time=7)
+    
+    # Store 2 has no sales of product 11; the rest keep inventory order
+    assert list(zip(result['store_id'], result['product_id'])) == [(2, 10), (1, 10), (1, 11)]
+    assert result['daily_demand'].tolist() == [10, 2, 1]
+    assert result['current_quantity'].tolist() == [5, 50, 7]
+    # Constant demand needs no safety stock
+    np.testing.assert_allclose(result['reorder_point'], [70, 14, 7])
+    assert result['eoq'].iloc[0] > result['eoq'].iloc[1]
+
+def test_forecast_driven_reorder_points():
+    """Test reorder points from lead-time forecasts split between stores"""
+    inventory_data = pd.DataFrame({
+        'store_id': [1, 2],
+        'product_id': [10, 10],
+        'quantity': [5, 5],
+        'unit_cost': [4.0, 4.0],
+        'reorder_point': [10, 10]
+    })
+    # Store 1 sold three times as much as store 2
+    demand_summary = pd.DataFrame({
+        'store_id': [1, 2],
+        'product_id': [10, 10],
+        'daily_demand': [3.0, 1.0],
+        'demand_std': [1.0, 1.0]
+    })
+    # Two units a day with a standard deviation of one, plus a past day
+    dates = pd.date_range(pd.Timestamp.now().normalize(), periods=11, freq='D')
+    forecast = pd.DataFrame({
+        'product_id': 10,
+        'ds': dates,
+        'yhat': 2.0,
+        'yhat_lower': 2.0 - 1.959964,
+        'yhat_upper': 2.0 + 1.959964
+    })
+    
+    result = optimize_inventory_levels(
+        inventory_data, demand_summary, lead_time=7, service_level=0.95, forecast=forecast
+    )
+    
+    shares = np.array([0.75, 0.25])
+    np.testing.assert_allclose(result['daily_demand'], 2 * shares)
+    # Independent stores split the variance, not the standard deviation
+    np.testing.assert_allclose(result['demand_std'], np.sqrt(shares), rtol=1e-5)
+    safety_stock = 1.644854 * np.sqrt(7) * np.sqrt(shares)
+    np.testing.assert_allclose(result['safety_stock'], safety_stock, rtol=1e-5)
+    np.testing.assert_allclose(result['reorder_point'], 14 * shares + safety_stock, rtol=1e-5)
+
+def test_generate_inventory_recommendations():
+    """Test the reorder and reduce stock actions picked for each row"""
+    optimization_results = pd.DataFrame({
+        'product_id': [1, 2, 3, 4],
+        'current_quantity': [5, 50, 15, 10],
+        'eoq': [40.0, 40.0, 40.0, 40.0],
+        'safety_stock': [3.0, 3.0, 3.0, np.nan],
+        'reorder_point': [10.0, 10.0, 10.0, np.nan]
+    })
+    
+    recommendations = generate_inventory_recommendations(optimization_results)
+    
+    assert recommendations['product_id'].tolist() == [1, 2]
+    assert recommendations['action'].tolist() == ['Reorder', 'Reduce Stock']
+    assert recommendations['recommended_quantity'].tolist() == [40.0, 13.0]
+    assert list(recommendations.columns) == [
+        'product_id', 'action', 'current_quantity', 'recommended_quantity', 'reorder_point'
+    ]
+
+def test_simulate_inventory_policy():
+    """Test simulated fill rates and stockouts of reorder policies"""
+    # Two units a day, every day, for three SKUs
+    history = np.full((3, 30), 2.0)
+    results = simulate_inventory_policy(
+        reorder_point=[20, 0, 20],
+        order_quantity=[30, 30, 0],
+        lead_time=5,
+        history=history,
+        initial_inventory=[40, 5, 10],
+        holding_cost=0.1,
+        n_paths=50,
+        n_days=60,
+        block_size=2
+    )
+    
+    assert list(results.columns) == [
+        'fill_rate', 'stockout_days', 'cycle_service_level', 'holding_cost',
+        'average_on_hand', 'orders'
+    ]
+    # Reordering with ten days of cover never runs out
+    assert results.loc[0, 'fill_rate'] == 1
+    assert results.loc[0, 'stockout_days'] == 0
+    assert results.loc[0, 'holding_cost'] > 0
+    # Reordering only when empty runs out during every lead time
+    assert results.loc[1, 'fill_rate'] < 1
+    assert results.loc[1, 'stockout_days'] > 0
+    # Without orders the stock lasts five days
+    assert results.loc[2, 'stockout_days'] == 55
+    assert results.loc[2, 'orders'] == 0
+    
+    # Intermittent demand sampled around a forecast
+    forecast = np.full((2, 60), 0.5)
+    results = simulate_inventory_policy([3, 3], [10, 10], forecast=forecast, n_paths=200, n_days=60)
+    assert len(results) == 2
+    assert results['fill_rate'].between(0, 1).all()
+
 def test_product_recommendations():
     """Test product recommendations"""
     db = next(get_db())
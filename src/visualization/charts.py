@@ -86,7 +86,7 @@ def create_inventory_status_chart(inventory_data):
             raise ValueError(f"Missing required columns: {missing_cols}")
         
         # Group by category and calculate metrics
-        category_metrics = inventory_data.groupby('category').agg({
+        category_metrics = inventory_data.groupby('category', observed=True).agg({
             'quantity': 'sum',
             'total_value': 'sum'
         }).reset_index()